@@ -0,0 +1,84 @@
+"""
+Benchmark filling one permit packet of N records against N separate fills,
+and check that each page of the packet matches the separate fill of its
+record
+
+Usage:
+    python benchmarks/bench_fill_packet.py [records]
+"""
+import sys
+import tempfile
+import time
+import zipfile
+
+from lxml import etree
+
+from synthetic_rules import REPO_DIR, SRC_DIR
+
+sys.path.insert(0, str(SRC_DIR))
+
+from form_filler import FormFiller
+
+TEMPLATES_DIR = REPO_DIR / "templates"
+TEMPLATE = "building-permit.docx"
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def record(number):
+    return {
+        "projectAddress": f"{number} Main Street, Springfield",
+        "ownerName": f"Owner {number}",
+        "ownerPhone": f"555-{number:04d}",
+        "contractorName": "Acme Builders",
+        "contractorLicense": "LIC-42",
+        "projectDescription": f"Renovation number {number}",
+        "estimatedCost": f"${number * 1000:,}",
+    }
+
+
+def body(path):
+    """Serialized body elements, page breaks as None"""
+    with zipfile.ZipFile(path) as archive:
+        root = etree.fromstring(archive.read("word/document.xml"))
+    return [
+        None if element.xpath("w:r/w:br[@w:type='page']", namespaces={"w": W[1:-1]})
+        else etree.tostring(element)
+        for element in root.find(f"{W}body")
+        if element.tag != f"{W}sectPr"
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    records = [record(number) for number in range(count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        filler = FormFiller(str(TEMPLATES_DIR), tmp, deduplicate=False)
+        filler.fill_permit(TEMPLATE, "bench", "Bench", records[0])
+
+        started = time.perf_counter()
+        singles = [filler.fill_permit(TEMPLATE, "bench", "Bench", data) for data in records]
+        separate_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        packet = filler.fill_packet(TEMPLATE, "bench", "Bench", records)
+        packet_s = time.perf_counter() - started
+
+        pages = [[]]
+        for element in body(packet["outputPath"]):
+            if element is None:
+                pages.append([])
+            else:
+                pages[-1].append(element)
+        assert len(pages) == count, f"{len(pages)} pages for {count} records"
+        for number, (page, single) in enumerate(zip(pages, singles)):
+            assert page == body(single["outputPath"]), f"record {number} differs from its separate fill"
+
+    print(f"{count} records of {TEMPLATE}")
+    print(f"  separate fills {separate_s * 1000:>9.0f} ms")
+    print(f"  one packet     {packet_s * 1000:>9.0f} ms ({separate_s / packet_s:.1f}x)")
+    print("  every page matches its separate fill")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark filling a permit form from the raw template file, from the
+compiled template cache, and repeating an identical fill (served by the
+deduplicating output store)
+
+Usage:
+    python benchmarks/bench_fill_permit.py
+"""
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+from synthetic_rules import REPO_DIR, SRC_DIR
+
+sys.path.insert(0, str(SRC_DIR))
+
+from docxtpl import DocxTemplate
+
+from form_filler import FormFiller
+
+TEMPLATES_DIR = REPO_DIR / "templates"
+
+PROJECT_DATA = {
+    "projectAddress": "123 Main Street, Springfield",
+    "ownerName": "Jane Doe",
+    "ownerPhone": "555-0100",
+    "ownerEmail": "jane@example.com",
+    "contractorName": "Acme Builders & Sons",
+    "contractorLicense": "LIC-42",
+    "projectDescription": "Kitchen renovation with new wiring and pipes",
+    "estimatedCost": "$45,000",
+    "startDate": "01/15/2025",
+}
+
+ROUNDS = 50
+
+
+def parts(docx_file):
+    with zipfile.ZipFile(docx_file) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def fill_uncached(template_path, output_path):
+    """What fill_permit did before the template cache"""
+    today = datetime.now().strftime('%m/%d/%Y')
+    doc = DocxTemplate(template_path)
+    doc.render({
+        **PROJECT_DATA,
+        'permitDate': today,
+        'applicationDate': today,
+        'currentDate': today,
+        'year': datetime.now().year
+    })
+    doc.save(output_path)
+
+
+def main():
+    print(f"{'template':>24} {'uncached ms':>12} {'cached ms':>10} {'speedup':>8} {'repeat ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        filler = FormFiller(str(TEMPLATES_DIR), tmp, deduplicate=False)
+        deduplicating = FormFiller(str(TEMPLATES_DIR), tmp)
+        uncached_path = f"{tmp}/uncached.docx"
+
+        for template_path in sorted(TEMPLATES_DIR.glob("*.docx")):
+            started = time.perf_counter()
+            for _ in range(ROUNDS):
+                fill_uncached(template_path, uncached_path)
+            uncached_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+
+            started = time.perf_counter()
+            for _ in range(ROUNDS):
+                result = filler.fill_permit(template_path.name, "bench", "Bench", PROJECT_DATA)
+            cached_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+
+            assert parts(result["outputPath"]) == parts(uncached_path)
+
+            first = deduplicating.fill_permit(template_path.name, "bench", "Bench", PROJECT_DATA)
+            started = time.perf_counter()
+            for _ in range(ROUNDS):
+                result = deduplicating.fill_permit(template_path.name, "bench", "Bench", PROJECT_DATA)
+            repeat_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+
+            assert result["deduplicated"] and result["outputPath"] == first["outputPath"]
+            print(
+                f"{template_path.name:>24} {uncached_ms:>12.1f} {cached_ms:>10.1f} "
+                f"{uncached_ms / cached_ms:>7.1f}x {repeat_ms:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark PermitMatcher.identify_permits against the original trigger loop
+
+Usage:
+    python benchmarks/bench_identify_permits.py
+"""
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+from synthetic_rules import SRC_DIR, build_descriptions, write_catalog
+
+sys.path.insert(0, str(SRC_DIR))
+
+from permit_matcher import PermitMatcher
+
+
+def legacy_identify_permits(rules, project_description, work_types=None):
+    """The per-permit, per-trigger substring loop the automaton replaced"""
+    if work_types is None:
+        work_types = []
+    search_text = f"{project_description} {' '.join(work_types)}".lower()
+
+    required_permits = []
+    for permit in rules['permits']:
+        matches = any(
+            trigger.lower() in search_text
+            for trigger in permit['triggers']
+        )
+        if matches:
+            required_permits.append({
+                'id': permit['id'],
+                'name': permit['name'],
+                'template': permit['template'],
+                'requiredFields': permit['requiredFields']
+            })
+    return required_permits
+
+
+def main():
+    descriptions = build_descriptions(200)
+
+    print(f"{'permits':>8} {'legacy ms/call':>15} {'compiled ms/call':>18} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_permits in (3, 100, 1000, 5000):
+            rules_file = write_catalog(Path(tmp) / f"rules-{num_permits}.json", num_permits)
+            matcher = PermitMatcher(str(rules_file), cache_size=0)
+
+            for description in descriptions:
+                expected = legacy_identify_permits(matcher.rules, description)
+                assert matcher.identify_permits(description) == expected
+
+            legacy = timeit.timeit(
+                lambda: [legacy_identify_permits(matcher.rules, d) for d in descriptions],
+                number=3,
+            )
+            compiled = timeit.timeit(
+                lambda: [matcher.identify_permits(d) for d in descriptions],
+                number=3,
+            )
+
+            calls = 3 * len(descriptions)
+            print(
+                f"{num_permits:>8} {legacy / calls * 1000:>15.3f} "
+                f"{compiled / calls * 1000:>18.3f} {legacy / compiled:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Benchmark TF-IDF relevance ranking, one description at a time and batched
+
+Usage:
+    python benchmarks/bench_ranking.py
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic_rules import RULES_FILE, SRC_DIR, build_descriptions, write_catalog
+
+sys.path.insert(0, str(SRC_DIR))
+
+from permit_matcher import PermitMatcher
+
+
+def check_shipped_rules():
+    """Words sharing only inner n-grams with a trigger still rank its permit"""
+    matcher = PermitMatcher(str(RULES_FILE), snapshot=False, ranking=True)
+    ranked = matcher.rank_permits("Rewire the kitchen")
+    assert ranked and ranked[0]['id'] == 'electrical', ranked
+    assert ranked[0]['score'] >= 0.1, ranked
+
+
+def main():
+    check_shipped_rules()
+    descriptions = build_descriptions(200)
+
+    print(
+        f"{'permits':>8} {'build ms':>9} {'single ms/desc':>15} {'batch ms/desc':>14} "
+        f"{'unlimited batch ms/desc':>24} {'avg hits':>9} {'unlimited hits':>15}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_permits in (100, 1000, 10000):
+            rules_file = write_catalog(Path(tmp) / f"rules-{num_permits}.json", num_permits)
+
+            started = time.perf_counter()
+            matcher = PermitMatcher(str(rules_file), snapshot=False, ranking=True)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            single = [matcher.rank_permits(description) for description in descriptions]
+            single_ms = (time.perf_counter() - started) * 1000 / len(descriptions)
+
+            started = time.perf_counter()
+            batch = matcher.rank_permits_many(descriptions)
+            batch_ms = (time.perf_counter() - started) * 1000 / len(descriptions)
+
+            started = time.perf_counter()
+            every = matcher.rank_permits_many(descriptions, limit=num_permits)
+            every_ms = (time.perf_counter() - started) * 1000 / len(descriptions)
+
+            assert batch == single
+            assert all(best == ranked[:len(best)] for best, ranked in zip(batch, every))
+            hits = sum(len(ranked) for ranked in batch) / len(batch)
+            every_hits = sum(len(ranked) for ranked in every) / len(every)
+            print(
+                f"{num_permits:>8} {build_ms:>9.1f} {single_ms:>15.3f} {batch_ms:>14.3f} "
+                f"{every_ms:>24.3f} {hits:>9.0f} {every_hits:>15.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
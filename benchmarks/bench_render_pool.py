@@ -0,0 +1,74 @@
+"""
+Benchmark permit fill throughput of the thread executor and the pre-forked
+render pool at several worker counts
+
+Fills are CPU-bound and hold the GIL, so only the process pool should scale
+with the number of cores.
+
+Usage:
+    python benchmarks/bench_render_pool.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from synthetic_rules import REPO_DIR, SRC_DIR
+
+sys.path.insert(0, str(SRC_DIR))
+
+from form_filler import FormFiller
+
+TEMPLATES_DIR = REPO_DIR / "templates"
+
+TEMPLATES = ("building-permit.docx", "electrical-permit.docx", "plumbing-permit.docx")
+
+PROJECT_DATA = {
+    "projectAddress": "123 Main Street, Springfield",
+    "ownerName": "Jane Doe",
+    "contractorName": "Acme Builders",
+    "projectDescription": "Kitchen renovation with new wiring and pipes",
+}
+
+FILLS = 300
+
+
+async def fill_all(filler):
+    return await asyncio.gather(*[
+        filler.fill_permit_async(TEMPLATES[i % len(TEMPLATES)], f"bench{i}", "Bench", PROJECT_DATA)
+        for i in range(FILLS)
+    ])
+
+
+def throughput(executor, workers, output_dir):
+    filler = FormFiller(str(TEMPLATES_DIR), output_dir, executor, workers, deduplicate=False)
+    filler.start()
+    # Warm up every worker's templates
+    asyncio.run(fill_all(filler))
+
+    started = time.perf_counter()
+    results = asyncio.run(fill_all(filler))
+    elapsed = time.perf_counter() - started
+    filler.shutdown()
+
+    assert all(result["success"] for result in results)
+    return FILLS / elapsed
+
+
+def main():
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cores})
+    print(f"{cores} CPU cores")
+    print(f"{'workers':>8} {'thread fills/s':>15} {'process fills/s':>16} {'process scaling':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        single = None
+        for workers in counts:
+            threaded = throughput("thread", workers, tmp)
+            pooled = throughput("process", workers, tmp)
+            single = single or pooled
+            print(f"{workers:>8} {threaded:>15.0f} {pooled:>16.0f} {pooled / single:>15.2f}x")
+
+
+if __name__ == "__main__":
+    main()
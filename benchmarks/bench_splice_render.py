@@ -0,0 +1,68 @@
+"""
+Benchmark rendering the shipped templates through docxtpl (from the
+compiled template cache) against splicing the values into the rendered
+body, and a whole fill_permit call
+
+Usage:
+    python benchmarks/bench_splice_render.py
+"""
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from synthetic_rules import REPO_DIR, SRC_DIR
+
+sys.path.insert(0, str(SRC_DIR))
+
+from form_filler import FormFiller
+from template_cache import CompiledTemplate
+
+TEMPLATES_DIR = REPO_DIR / "templates"
+
+PROJECT_DATA = {
+    "projectAddress": "123 Main Street, Springfield",
+    "ownerName": "Jane Doe",
+    "ownerPhone": "555-0100",
+    "contractorName": "Acme Builders",
+    "contractorLicense": "LIC-42",
+    "projectDescription": "Kitchen renovation with new wiring and pipes",
+    "estimatedCost": "$45,000",
+    "startDate": "01/15/2025",
+}
+
+ROUNDS = 200
+
+
+def timed(call):
+    call()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        call()
+    return (time.perf_counter() - started) * 1000 / ROUNDS
+
+
+def main():
+    today = datetime.now().strftime('%m/%d/%Y')
+    context = {**PROJECT_DATA, 'permitDate': today, 'applicationDate': today}
+    print(f"{'template':>24} {'compile ms':>11} {'docxtpl ms':>11} {'splice ms':>10} {'speedup':>8} {'fill ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        filler = FormFiller(str(TEMPLATES_DIR), tmp, deduplicate=False)
+        for template_path in sorted(TEMPLATES_DIR.glob("*.docx")):
+            source = template_path.read_bytes()
+            started = time.perf_counter()
+            compiled = CompiledTemplate(template_path, (0, 0), source)
+            compile_ms = (time.perf_counter() - started) * 1000
+            assert compiled.spliced and compiled._splice.render(context) is not None
+
+            docxtpl_ms = timed(lambda: compiled.render_docxtpl(context))
+            splice_ms = timed(lambda: compiled.render(context))
+            fill_ms = timed(lambda: filler.fill_permit(template_path.name, "bench", "Bench", PROJECT_DATA))
+            print(
+                f"{template_path.name:>24} {compile_ms:>11.1f} {docxtpl_ms:>11.2f} {splice_ms:>10.3f} "
+                f"{docxtpl_ms / splice_ms:>7.0f}x {fill_ms:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark PermitMatcher start-up with and without the compiled rules snapshot
+
+Usage:
+    python benchmarks/bench_startup.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic_rules import SRC_DIR, write_catalog
+
+sys.path.insert(0, str(SRC_DIR))
+
+from permit_matcher import PermitMatcher
+from rules_snapshot import snapshot_path
+
+
+def timed(**kwargs):
+    started = time.perf_counter()
+    matcher = PermitMatcher(**kwargs)
+    return matcher, (time.perf_counter() - started) * 1000
+
+
+def check_same_stamp_rewrite(rules_file, options):
+    """A same-size rewrite with the old mtime restored (cp -p) is recompiled"""
+    stat = rules_file.stat()
+    catalog = json.loads(rules_file.read_text())
+    permit = catalog['permits'][0]
+    permit['name'] = permit['name'].swapcase()
+    rules_file.write_text(json.dumps(catalog))
+    os.utime(rules_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert rules_file.stat().st_size == stat.st_size
+
+    matcher = PermitMatcher(**options)
+    assert matcher.get_permit_by_id(permit['id'])['name'] == permit['name']
+
+
+def main():
+    print(
+        f"{'permits':>8} {'json MB':>8} {'engine':>10} {'no snapshot ms':>15} "
+        f"{'first start ms':>15} {'snapshot ms':>12} {'touched ms':>11}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_permits in (1000, 5000, 20000):
+            rules_file = write_catalog(Path(tmp) / f"rules-{num_permits}.json", num_permits)
+            size_mb = rules_file.stat().st_size / 1e6
+
+            for engine in ('substring', 'token'):
+                snapshot_path(rules_file, engine).unlink(missing_ok=True)
+                options = dict(rules_file=str(rules_file), engine=engine)
+
+                baseline, plain_ms = timed(snapshot=False, **options)
+                _, first_ms = timed(**options)
+                warm, warm_ms = timed(**options)
+                # Same content, new mtime: hashed but not recompiled
+                rules_file.touch()
+                _, touched_ms = timed(**options)
+                check_same_stamp_rewrite(rules_file, options)
+
+                description = "kitchen renovation with new wiring and pipes"
+                assert warm.identify_permits(description) == baseline.identify_permits(description)
+                del baseline, warm
+
+                print(
+                    f"{num_permits:>8} {size_mb:>8.1f} {engine:>10} {plain_ms:>15.1f} "
+                    f"{first_ms:>15.1f} {warm_ms:>12.1f} {touched_ms:>11.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the shipped templates against their compacted versions: size,
+compile time (a template cache miss) and fill time (a hit)
+
+Usage:
+    python benchmarks/bench_template_compaction.py
+"""
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from synthetic_rules import REPO_DIR, SRC_DIR
+
+sys.path.insert(0, str(SRC_DIR))
+
+from form_filler import FormFiller
+from template_cache import CompiledTemplate
+from template_compactor import compact_template, verify_compaction
+
+TEMPLATES_DIR = REPO_DIR / "templates"
+
+PROJECT_DATA = {
+    "projectAddress": "123 Main Street, Springfield",
+    "ownerName": "Jane Doe",
+    "ownerPhone": "555-0100",
+    "contractorName": "Acme Builders",
+    "contractorLicense": "LIC-42",
+    "projectDescription": "Kitchen renovation with new wiring and pipes",
+    "estimatedCost": "$45,000",
+}
+
+ROUNDS = 50
+
+
+def unzipped_size(path):
+    with zipfile.ZipFile(path) as archive:
+        return sum(info.file_size for info in archive.infolist())
+
+
+def compile_ms(path):
+    source = path.read_bytes()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        CompiledTemplate(path, (0, 0), source)
+    return (time.perf_counter() - started) * 1000 / ROUNDS
+
+
+def fill_ms(filler, template_name):
+    filler.fill_permit(template_name, "bench", "Bench", PROJECT_DATA)
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = filler.fill_permit(template_name, "bench", "Bench", PROJECT_DATA)
+    return (time.perf_counter() - started) * 1000 / ROUNDS, Path(result["outputPath"]).stat().st_size
+
+
+def main():
+    print(
+        f"{'template':>24} {'':>9} {'zip KB':>7} {'xml KB':>7} "
+        f"{'compile ms':>11} {'fill ms':>8} {'output KB':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        compacted_dir = Path(tmp) / "compacted"
+        compacted_dir.mkdir()
+        original_filler = FormFiller(str(TEMPLATES_DIR), f"{tmp}/original-out", deduplicate=False)
+        compacted_filler = FormFiller(str(compacted_dir), f"{tmp}/compacted-out", deduplicate=False)
+
+        for template_path in sorted(TEMPLATES_DIR.glob("*.docx")):
+            original = template_path.read_bytes()
+            compacted = compact_template(original)
+            verify_compaction(original, compacted)
+            compacted_path = compacted_dir / template_path.name
+            compacted_path.write_bytes(compacted)
+
+            for label, path, filler in (
+                ("original", template_path, original_filler),
+                ("compacted", compacted_path, compacted_filler),
+            ):
+                fill, output_size = fill_ms(filler, path.name)
+                print(
+                    f"{template_path.name:>24} {label:>9} {path.stat().st_size / 1024:>7.1f} "
+                    f"{unzipped_size(path) / 1024:>7.1f} {compile_ms(path):>11.1f} "
+                    f"{fill:>8.2f} {output_size / 1024:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark the 'token' matching engine against the 'substring' one
+
+Its conformance checks are in tests/test_token_matcher.py.
+
+Usage:
+    python benchmarks/bench_token_matcher.py
+"""
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+from synthetic_rules import SRC_DIR, build_descriptions, write_catalog
+
+sys.path.insert(0, str(SRC_DIR))
+
+from permit_matcher import PermitMatcher
+
+
+def main():
+    descriptions = build_descriptions(200)
+
+    print(f"{'permits':>8} {'substring ms/call':>18} {'token ms/call':>14} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_permits in (3, 100, 1000, 5000):
+            rules_file = str(write_catalog(Path(tmp) / f"rules-{num_permits}.json", num_permits))
+            substring = PermitMatcher(rules_file, engine='substring', cache_size=0)
+            token = PermitMatcher(rules_file, engine='token', cache_size=0)
+
+            substring_time = timeit.timeit(
+                lambda: [substring.identify_permits(d) for d in descriptions],
+                number=3,
+            )
+            token_time = timeit.timeit(
+                lambda: [token.identify_permits(d) for d in descriptions],
+                number=3,
+            )
+
+            calls = 3 * len(descriptions)
+            print(
+                f"{num_permits:>8} {substring_time / calls * 1000:>18.3f} "
+                f"{token_time / calls * 1000:>14.3f} {substring_time / token_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
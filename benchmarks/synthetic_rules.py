@@ -0,0 +1,60 @@
+"""Synthetic permit catalogs and project descriptions for the benchmarks"""
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+REPO_DIR = Path(__file__).parent.parent
+SRC_DIR = REPO_DIR / "src"
+RULES_FILE = REPO_DIR / "data" / "permit_rules.json"
+
+WORDS = [
+    "roof", "deck", "fence", "pool", "solar", "hvac", "duct", "boiler",
+    "furnace", "chimney", "garage", "shed", "porch", "driveway", "basement",
+    "attic", "window", "door", "stair", "railing", "sprinkler", "alarm",
+    "sign", "tank", "septic", "well", "grading", "retaining", "wall",
+    "demolition", "excavation", "foundation", "footing", "framing",
+    "insulation", "drywall", "siding", "gutter", "awning", "canopy",
+    "elevator", "generator", "meter", "transformer", "conduit", "trench",
+]
+
+
+def build_catalog(num_permits: int, triggers_per_permit: int = 5, seed: int = 7) -> Dict[str, Any]:
+    """Build a rules document shaped like data/permit_rules.json"""
+    rng = random.Random(seed)
+    base = json.loads(RULES_FILE.read_text())
+
+    permits = list(base["permits"])
+    for index in range(num_permits - len(permits)):
+        triggers = [
+            f"{rng.choice(WORDS)} {rng.choice(WORDS)} {index}-{n}"
+            for n in range(triggers_per_permit)
+        ]
+        permits.append({
+            "id": f"permit-{index}",
+            "name": f"Synthetic Permit {index}",
+            "template": "building-permit.docx",
+            "triggers": triggers,
+            "requiredFields": ["projectAddress", "ownerName"],
+        })
+
+    return {"permits": permits}
+
+
+def write_catalog(path: Path, num_permits: int, triggers_per_permit: int = 5) -> Path:
+    """Write a synthetic catalog to disk and return its path"""
+    path.write_text(json.dumps(build_catalog(num_permits, triggers_per_permit)))
+    return path
+
+
+def build_descriptions(count: int, words_per_description: int = 40, seed: int = 11) -> List[str]:
+    """Build realistic-length project descriptions mixing real trigger phrases"""
+    rng = random.Random(seed)
+    vocabulary = WORDS + [
+        "kitchen", "renovation", "new", "wiring", "panel", "upgrade", "replace",
+        "bathroom", "pipes", "sewer", "addition", "the", "and", "with", "of",
+    ]
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(words_per_description))
+        for _ in range(count)
+    ]
\ No newline at end of file
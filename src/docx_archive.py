@@ -0,0 +1,150 @@
+import io
+import struct
+import time
+import zipfile
+import zlib
+from typing import BinaryIO, Dict, Iterable, List, Tuple, Union
+
+# Fixed-size parts of the zip records (APPNOTE 4.3.7, 4.3.12, 4.3.16)
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+
+_ZIP_VERSION = 20
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+
+class RawMember:
+    """A zip member held as its compressed bytes, ready to be copied as is"""
+
+    __slots__ = ('name', 'method', 'flags', 'date_time', 'crc', 'size', 'data')
+
+    def __init__(
+        self,
+        name: str,
+        method: int,
+        flags: int,
+        date_time: Tuple[int, int],
+        crc: int,
+        size: int,
+        data: bytes
+    ):
+        self.name = name
+        self.method = method
+        self.flags = flags
+        # DOS (time, date) pair
+        self.date_time = date_time
+        self.crc = crc
+        self.size = size
+        self.data = data
+
+    @classmethod
+    def deflate(cls, name: str, content: bytes) -> 'RawMember':
+        """Compress new content into a member, stamped with the current time"""
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(content) + compressor.flush()
+        year, month, day, hour, minute, second = time.localtime()[:6]
+        return cls(
+            name,
+            zipfile.ZIP_DEFLATED,
+            0,
+            (hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day),
+            zlib.crc32(content),
+            len(content),
+            data
+        )
+
+    def read(self) -> bytes:
+        """Decompressed content"""
+        if self.method == zipfile.ZIP_STORED:
+            return self.data
+        if self.method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(self.data, -15)
+        raise ValueError(f"Unsupported compression method {self.method} for {self.name}")
+
+
+class TemplateArchive:
+    """
+    The members of a .docx template, kept compressed
+
+    The zip directory is read once; each member's compressed bytes are then
+    sliced straight out of the archive, so unchanged parts can be written to
+    a filled document without being inflated and deflated again.
+    """
+
+    def __init__(self, source: bytes):
+        self.members: Dict[str, RawMember] = {}
+        with zipfile.ZipFile(io.BytesIO(source)) as archive:
+            for info in archive.infolist():
+                # The local header's name and extra field lengths can differ
+                # from the central directory's
+                fields = _LOCAL_HEADER.unpack_from(source, info.header_offset)
+                start = info.header_offset + _LOCAL_HEADER.size + fields[9] + fields[10]
+                self.members[info.filename] = RawMember(
+                    info.filename,
+                    info.compress_type,
+                    info.flag_bits & _FLAG_UTF8,
+                    (fields[4], fields[5]),
+                    info.CRC,
+                    info.file_size,
+                    source[start:start + info.compress_size]
+                )
+
+    def read(self, name: str) -> bytes:
+        """Decompressed content of a member"""
+        return self.members[name].read()
+
+
+def write_archive(members: Iterable[RawMember], output: Union[str, BinaryIO]) -> None:
+    """
+    Write a zip archive from already compressed members
+
+    Args:
+        members: Members in archive order
+        output: Path or writable binary file
+
+    Raises:
+        ValueError: If the archive would need ZIP64 extensions
+    """
+    chunks: List[bytes] = []
+    central: List[bytes] = []
+    offset = 0
+
+    for member in members:
+        name = member.name.encode('utf-8')
+        flags = member.flags & ~_FLAG_DATA_DESCRIPTOR
+        if not name.isascii():
+            flags |= _FLAG_UTF8
+        if max(offset, member.size, len(member.data)) >= _ZIP32_LIMIT:
+            raise ValueError(f"Archive too large to write without ZIP64: {member.name}")
+
+        time_field, date_field = member.date_time
+        header = _LOCAL_HEADER.pack(
+            _LOCAL_SIGNATURE, _ZIP_VERSION, flags, member.method, time_field, date_field,
+            member.crc, len(member.data), member.size, len(name), 0
+        )
+        central.append(_CENTRAL_HEADER.pack(
+            _CENTRAL_SIGNATURE, _ZIP_VERSION, _ZIP_VERSION, flags, member.method, time_field,
+            date_field, member.crc, len(member.data), member.size, len(name), 0, 0, 0, 0, 0, offset
+        ) + name)
+        chunks += (header, name, member.data)
+        offset += len(header) + len(name) + len(member.data)
+
+    directory = b''.join(central)
+    if len(central) >= 0xFFFF or offset + len(directory) >= _ZIP32_LIMIT:
+        raise ValueError("Archive too large to write without ZIP64")
+    chunks += (directory, _END_RECORD.pack(
+        _END_SIGNATURE, 0, 0, len(central), len(central), len(directory), offset, 0
+    ))
+
+    if hasattr(output, 'write'):
+        output.writelines(chunks)
+    else:
+        with open(output, 'wb') as f:
+            f.writelines(chunks)
@@ -1,15 +1,127 @@
-from docxtpl import DocxTemplate
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional
+import asyncio
+import hashlib
+import itertools
+import logging
+import multiprocessing
 import os
+import threading
+import time
+
+from output_store import BundleWriter, OutputStore, shard_dir, write_atomically
+from render_pool import RenderPool
+from template_cache import TemplateCache
+
+logger = logging.getLogger(__name__)
+
+# Kinds of executor fill_permit_async can render in
+EXECUTOR_KINDS = ('thread', 'process')
+
+# Fields fill_permit fills in itself
+AUTO_FILLED_FIELDS = ('permitDate', 'applicationDate', 'currentDate', 'year')
+
+# Largest filled document fill_permit returns in memory rather than saving
+INLINE_SIZE_LIMIT = 5 * 1024 * 1024
+
+# Per-process sequence number that keeps output names unique within a millisecond
+_output_sequence = itertools.count()
+
+# FormFiller of the current worker process, when rendering in processes
+_worker_filler = None
+
+def _init_worker(templates_dir: str, output_dir: str, deduplicate: bool):
+    """Give each worker process its own filler, with every template loaded"""
+    global _worker_filler
+    _worker_filler = FormFiller(templates_dir, output_dir, deduplicate=deduplicate)
+    for template_path in sorted(_worker_filler.templates_dir.glob('*.docx')):
+        try:
+            _worker_filler.templates.get(template_path)
+        except Exception as e:
+            # A corrupt template only fails the fills that use it
+            logger.warning(f"Could not preload template {template_path.name}: {e}")
+
+def _fill_in_worker(*args):
+    return _worker_filler.fill_permit(*args)
+
+def _fill_packet_in_worker(*args):
+    return _worker_filler.fill_packet(*args)
+
+def _auto_fields() -> Dict[str, Any]:
+    """The AUTO_FILLED_FIELDS, as of now"""
+    return {
+        'permitDate': datetime.now().strftime('%m/%d/%Y'),
+        'applicationDate': datetime.now().strftime('%m/%d/%Y'),
+        'currentDate': datetime.now().strftime('%m/%d/%Y'),
+        'year': datetime.now().year
+    }
+
+def _output_stem(prefix: str, now: datetime) -> str:
+    """
+    Unique, time-sortable name for an output, without its extension
+    
+    The millisecond timestamp, process id and per-process sequence number
+    make names unique across threads and worker processes.
+    """
+    timestamp = f"{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}"
+    sequence = next(_output_sequence) % 10000
+    return f"{prefix}-{timestamp}-{os.getpid()}-{sequence:04d}"
+
+def _output_filename(permit_id: str, content: bytes, now: datetime, kind: str = 'permit') -> str:
+    """
+    Unique name for a filled permit; the content hash lets identical
+    documents be recognized from their names
+    """
+    digest = hashlib.blake2b(content, digest_size=4).hexdigest()
+    return f"{_output_stem(f'{permit_id}-{kind}', now)}-{digest}.docx"
 
 class FormFiller:
     """Fills Word document templates with project data"""
     
-    def __init__(self, templates_dir: str, output_dir: str):
+    def __init__(
+        self,
+        templates_dir: str,
+        output_dir: str,
+        executor: str = 'thread',
+        max_workers: Optional[int] = None,
+        worker_memory_limit: Optional[int] = None,
+        inline_size_limit: int = INLINE_SIZE_LIMIT,
+        deduplicate: bool = True
+    ):
+        """
+        Args:
+            templates_dir: Directory holding the .docx templates
+            output_dir: Directory filled permits are saved to
+            executor: Where fill_permit_async renders: 'thread' or 'process'
+            max_workers: Size of that executor (None for the executor's default)
+            worker_memory_limit: Resident bytes after which a 'process'
+                worker is replaced (None for no limit)
+            inline_size_limit: Largest document returned by an in-memory
+                fill; bigger ones are saved to output_dir instead
+            deduplicate: Return the existing output of an identical earlier
+                fill instead of rendering it again (saved fills only)
+        """
+        if executor not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor: {executor} (expected one of {', '.join(EXECUTOR_KINDS)})")
+        
         self.templates_dir = Path(templates_dir)
         self.output_dir = Path(output_dir)
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.worker_memory_limit = worker_memory_limit
+        self.inline_size_limit = inline_size_limit
+        self.store = OutputStore(self.output_dir) if deduplicate else None
+        
+        # Created on first use, so a filler that never renders asynchronously
+        # never starts workers
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        
+        # Templates are parsed and compiled once, then cloned per fill
+        self.templates = TemplateCache()
         
         # Ensure output directory exists
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -19,7 +131,8 @@ class FormFiller:
         template_name: str, 
         permit_id: str,
         permit_name: str,
-        project_data: Dict[str, Any]
+        project_data: Dict[str, Any],
+        in_memory: bool = False
     ) -> Dict[str, Any]:
         """
         Fill a permit form with project data
@@ -29,37 +142,134 @@ class FormFiller:
             permit_id: ID of the permit
             permit_name: Human-readable name of the permit
             project_data: Dictionary containing project information
+            in_memory: Return the document's bytes as 'content' instead of
+                saving it, unless it is larger than inline_size_limit
             
         Returns:
-            Dictionary with success status and output file path
+            Dictionary with success status and output file path, or with
+            the document's content when returned in memory
         """
         template_path = self.templates_dir / template_name
         
         if not template_path.exists():
             raise FileNotFoundError(f"Template not found: {template_path}")
         
-        # Load template
-        doc = DocxTemplate(template_path)
+        compiled = self.templates.get(template_path)
         
         # Prepare data with automatic date fields
-        fill_data = {
-            **project_data,
-            'permitDate': datetime.now().strftime('%m/%d/%Y'),
-            'applicationDate': datetime.now().strftime('%m/%d/%Y'),
-            'currentDate': datetime.now().strftime('%m/%d/%Y'),
-            'year': datetime.now().year
+        context = {**project_data, **_auto_fields()}
+        
+        # Only what the template reads: other keys neither render nor
+        # affect deduplication
+        fill_data = {name: context[name] for name in compiled.variables if name in context}
+        
+        # An identical earlier fill is returned without rendering; in-memory
+        # fills never touch the disk, so they skip the store
+        key = None
+        if self.store is not None and not in_memory:
+            key = self.store.key(compiled.digest, permit_id, fill_data)
+            existing = self.store.get(key)
+            result = self._existing_result(existing, permit_name) if existing is not None else None
+            if result is not None:
+                return result
+        
+        # Render into memory first: the name includes a hash of the content
+        content = compiled.render(fill_data)
+        return self._output_result(content, permit_id, permit_name, key, in_memory)
+    
+    def fill_packet(
+        self,
+        template_name: str,
+        permit_id: str,
+        permit_name: str,
+        records: List[Dict[str, Any]],
+        in_memory: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Fill a permit form for each of several projects, into one document
+        
+        The applications follow one another in the order of records, each
+        starting on a new page. The template is rendered in a single pass:
+        the document is parsed, its styles handled and the result zipped
+        once, however many records there are; a template with only plain
+        placeholders has each page spliced, as fill_permit does. Headers,
+        footers and document properties appear once per packet, so they
+        only see the date fields and the fields every record shares.
+        
+        Args:
+            template_name: Name of the template file
+            permit_id: ID of the permit
+            permit_name: Human-readable name of the permit
+            records: Project data of each application, in order
+            in_memory: As for fill_permit
+            
+        Returns:
+            Same as fill_permit, plus the number of records
+        """
+        if not records:
+            raise ValueError("A permit packet needs at least one record")
+        
+        template_path = self.templates_dir / template_name
+        
+        if not template_path.exists():
+            raise FileNotFoundError(f"Template not found: {template_path}")
+        
+        compiled = self.templates.get(template_path)
+        
+        auto_fields = _auto_fields()
+        records_data = []
+        for project_data in records:
+            context = {**project_data, **auto_fields}
+            records_data.append({name: context[name] for name in compiled.variables if name in context})
+        shared_data = {
+            name: value for name, value in records_data[0].items()
+            if all(name in record and record[name] == value for record in records_data[1:])
         }
         
-        # Render template with data
-        doc.render(fill_data)
+        key = None
+        if self.store is not None and not in_memory:
+            key = self.store.key(compiled.digest, permit_id, {'records': records_data})
+            existing = self.store.get(key)
+            result = self._existing_result(existing, permit_name) if existing is not None else None
+            if result is not None:
+                result['records'] = len(records)
+                return result
         
-        # Generate output filename
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        output_filename = f"{permit_id}-permit-{timestamp}.docx"
-        output_path = self.output_dir / output_filename
+        content = compiled.render_packet(records_data, shared_data)
+        result = self._output_result(content, permit_id, permit_name, key, in_memory, 'packet')
+        result['records'] = len(records)
+        return result
+    
+    def _output_result(
+        self,
+        content: bytes,
+        permit_id: str,
+        permit_name: str,
+        key: Optional[str],
+        in_memory: bool,
+        kind: str = 'permit'
+    ) -> Dict[str, Any]:
+        """Return a filled document in memory, or save it and record it under key"""
+        # Generate output filename, in a per-day, per-permit subdirectory
+        now = datetime.now()
+        output_filename = _output_filename(permit_id, content, now, kind)
+        output_path = shard_dir(self.output_dir, now.date(), permit_id) / output_filename
+        
+        if in_memory and len(content) <= self.inline_size_limit:
+            return {
+                'success': True,
+                'permitName': permit_name,
+                'outputFile': output_filename,
+                'size': len(content),
+                'content': content,
+                'message': f'{permit_name} has been filled'
+            }
         
-        # Save filled document
-        doc.save(output_path)
+        # Save filled document; in memory fills too large to return land here
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomically(output_path, content)
+        if key is not None:
+            self.store.put(key, output_path)
         
         return {
             'success': True,
@@ -69,6 +279,272 @@ class FormFiller:
             'message': f'{permit_name} has been filled and saved'
         }
     
+    def open_bundle(self, project_id: str) -> BundleWriter:
+        """
+        Start a zip bundle of a project's filled permits, in today's
+        'bundles' shard of the output directory
+        """
+        now = datetime.now()
+        path = shard_dir(self.output_dir, now.date(), 'bundles') / f"{_output_stem(f'{project_id}-bundle', now)}.zip"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return BundleWriter(path)
+    
+    def template_variables(self, template_name: str) -> FrozenSet[str]:
+        """Names of the variables a template reads"""
+        return self.templates.get(self.templates_dir / template_name).variables
+    
+    def check_templates(self, permits: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Cross-check permits' requiredFields against their templates' variables
+        
+        Args:
+            permits: Permit definitions from the rules file
+            
+        Returns:
+            One entry per permit whose template is missing, unreadable or
+            does not match: required fields the template never renders, and fields
+            it renders that are neither required nor filled in automatically
+            (and so come out blank unless provided)
+        """
+        problems = []
+        for permit in permits:
+            try:
+                variables = self.template_variables(permit['template'])
+            except FileNotFoundError:
+                problems.append({
+                    'permitId': permit['id'],
+                    'template': permit['template'],
+                    'error': 'Template not found'
+                })
+                continue
+            except Exception as e:
+                # A corrupt template only fails its own permit
+                problems.append({
+                    'permitId': permit['id'],
+                    'template': permit['template'],
+                    'error': str(e)
+                })
+                continue
+            
+            required = set(permit['requiredFields'])
+            unused = sorted(required - variables)
+            optional = sorted(variables - required - set(AUTO_FILLED_FIELDS))
+            if unused or optional:
+                problems.append({
+                    'permitId': permit['id'],
+                    'template': permit['template'],
+                    'requiredNotInTemplate': unused,
+                    'optionalInTemplate': optional
+                })
+        return problems
+    
+    def _existing_result(self, path: Path, permit_name: str) -> Optional[Dict[str, Any]]:
+        """
+        fill_permit result for a document found in the output store, or None
+        if it has been deleted since (e.g. by the retention sweeper)
+        
+        Reusing a document restarts its retention period, so it is not
+        swept right after being handed out again.
+        """
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        
+        return {
+            'success': True,
+            'permitName': permit_name,
+            'outputFile': path.name,
+            'outputPath': str(path.absolute()),
+            'deduplicated': True,
+            'message': f'{permit_name} was already filled with this data and saved'
+        }
+    
+    def start(self):
+        """Start the executor now rather than on the first asynchronous fill"""
+        self._get_executor()
+    
+    def executor_info(self) -> Dict[str, Any]:
+        """Executor kind, plus the worker pool's counters when rendering in processes"""
+        with self._executor_lock:
+            executor = self._executor
+        info = {'kind': self.executor_kind, 'maxWorkers': self.max_workers}
+        if isinstance(executor, RenderPool):
+            info.update(executor.info())
+        return info
+    
+    def _get_executor(self) -> Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                if self.executor_kind == 'process':
+                    # Forked workers start without re-importing the server module
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                    self._executor = RenderPool(
+                        self.max_workers,
+                        initializer=_init_worker,
+                        initargs=(str(self.templates_dir), str(self.output_dir), self.store is not None),
+                        max_memory=self.worker_memory_limit,
+                        mp_context=context
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        self.max_workers,
+                        thread_name_prefix='form-filler'
+                    )
+            return self._executor
+    
+    async def fill_permit_async(
+        self,
+        template_name: str,
+        permit_id: str,
+        permit_name: str,
+        project_data: Dict[str, Any],
+        in_memory: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Fill a permit form in the filler's executor, off the event loop
+        
+        Same arguments and result as fill_permit. Cancelling the awaiting
+        task frees the caller immediately; the render itself still runs
+        to completion in the executor.
+        """
+        args = (template_name, permit_id, permit_name, project_data, in_memory)
+        if self.executor_kind == 'process':
+            call = partial(_fill_in_worker, *args)
+        else:
+            call = partial(self.fill_permit, *args)
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), call)
+    
+    async def fill_packet_async(
+        self,
+        template_name: str,
+        permit_id: str,
+        permit_name: str,
+        records: List[Dict[str, Any]],
+        in_memory: bool = False
+    ) -> Dict[str, Any]:
+        """fill_packet in the filler's executor, off the event loop"""
+        args = (template_name, permit_id, permit_name, records, in_memory)
+        if self.executor_kind == 'process':
+            call = partial(_fill_packet_in_worker, *args)
+        else:
+            call = partial(self.fill_packet, *args)
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), call)
+    
+    async def _fill_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and fill one fill_many job into a compact result"""
+        result = {'project': job.get('project'), 'permitId': job.get('permitId')}
+        try:
+            if 'error' in job:
+                raise ValueError(job['error'])
+            
+            validation = self.validate_required_fields(job['projectData'], job['requiredFields'])
+            if not validation['valid']:
+                result.update(
+                    success=False,
+                    error='Missing required fields',
+                    missingFields=validation['missingFields']
+                )
+                return result
+            
+            filled = await self.fill_permit_async(
+                job['template'],
+                job['permitId'],
+                job['permitName'],
+                job['projectData']
+            )
+            result.update(success=True, outputFile=filled['outputFile'])
+        except Exception as e:
+            result.update(success=False, error=str(e))
+        return result
+    
+    async def fill_many(
+        self,
+        jobs: Iterable[Dict[str, Any]],
+        concurrency: int = 4,
+        on_result: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        max_failures: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Validate and fill many permits through a bounded pipeline
+        
+        Jobs are pulled lazily, so a large input is never held in memory at
+        once: at most `concurrency` renders run and twice as many jobs wait.
+        They are pulled a chunk at a time on a worker thread, so reading
+        and matching them never blocks the event loop; the jobs iterable
+        is only ever advanced by one thread at a time.
+        Each job is a dict with 'project' (the caller's key for the project),
+        'template', 'permitId', 'permitName', 'requiredFields' and
+        'projectData'. A job with an 'error' instead (an unreadable input
+        record, say) is reported as failed without rendering.
+        
+        Args:
+            jobs: Jobs to fill, in any order
+            concurrency: Number of fills in flight
+            on_result: Awaited with each job's compact result as it completes
+            max_failures: Number of failed results kept in the summary
+            
+        Returns:
+            Summary with job counts, elapsed time and the first failures
+        """
+        started = time.perf_counter()
+        queue = asyncio.Queue(maxsize=2 * concurrency)
+        summary = {'jobs': 0, 'filled': 0, 'failed': 0, 'failures': []}
+        
+        pending = iter(jobs)
+        
+        async def produce():
+            try:
+                while chunk := await asyncio.to_thread(
+                    list, itertools.islice(pending, queue.maxsize)
+                ):
+                    for job in chunk:
+                        await queue.put(job)
+            finally:
+                for _ in range(concurrency):
+                    await queue.put(None)
+        
+        async def work():
+            while (job := await queue.get()) is not None:
+                result = await self._fill_job(job)
+                summary['jobs'] += 1
+                if result['success']:
+                    summary['filled'] += 1
+                else:
+                    summary['failed'] += 1
+                    if len(summary['failures']) < max_failures:
+                        summary['failures'].append(result)
+                if on_result is not None:
+                    try:
+                        await on_result(result)
+                    except Exception as e:
+                        # Losing a progress update must not stall the pipeline
+                        logger.warning(f"Could not report fill result: {e}")
+        
+        outcomes = await asyncio.gather(
+            produce(),
+            *(work() for _ in range(concurrency)),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        
+        summary['elapsedMs'] = round((time.perf_counter() - started) * 1000, 1)
+        return summary
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the executor's workers, if any were started"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    
     def validate_required_fields(
         self, 
         project_data: Dict[str, Any], 
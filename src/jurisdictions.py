@@ -0,0 +1,189 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from periodic import PeriodicThread
+from permit_matcher import PermitMatcher
+
+logger = logging.getLogger(__name__)
+
+# Jurisdiction names double as file names, so keep them to a safe alphabet
+JURISDICTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+MANIFEST_FILE = "manifest.json"
+
+class JurisdictionRouter:
+    """
+    Routes requests to per-jurisdiction permit catalogs
+
+    Each jurisdiction has its own rules file (a shard) in the shards
+    directory, either listed in a manifest.json of the form
+    {"jurisdictions": {"<name>": "<file>.json"}} or simply named
+    <name>.json. A shard is loaded and compiled the first time a request
+    names its jurisdiction, with the same settings as the default matcher,
+    and at most max_resident compiled shards are kept, least recently used
+    first out. Requests without a jurisdiction go to the default matcher.
+
+    Shards compile outside the router lock, so a cold jurisdiction only
+    holds up other requests for that same jurisdiction.
+    """
+
+    def __init__(
+        self,
+        shards_dir: str,
+        default: PermitMatcher,
+        max_resident: int = 8
+    ):
+        self.shards_dir = Path(shards_dir)
+        self.default = default
+        self.max_resident = max_resident
+
+        self._resident: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # Per-jurisdiction locks held while a shard is being compiled
+        self._loading: Dict[str, threading.Lock] = {}
+        self._watcher = PeriodicThread(self.reload_if_changed, 'jurisdiction-rules-watcher')
+        self.loads = 0
+        self.evictions = 0
+
+    def _load_manifest(self) -> Dict[str, str]:
+        """Map of jurisdiction name to shard file name from manifest.json"""
+        manifest_file = self.shards_dir / MANIFEST_FILE
+        if not manifest_file.exists():
+            return {}
+        with open(manifest_file, 'r') as f:
+            return json.load(f).get('jurisdictions', {})
+
+    def _shard_file(self, jurisdiction: str) -> Path:
+        """Resolve the rules file of a jurisdiction"""
+        if not JURISDICTION_NAME.match(jurisdiction):
+            raise ValueError(f"Invalid jurisdiction: {jurisdiction}")
+
+        manifest = self._load_manifest()
+        file_name = manifest.get(jurisdiction, f"{jurisdiction}.json")
+        if jurisdiction not in manifest and file_name in manifest.values():
+            # A shard the manifest names is only reachable by that name,
+            # as list_jurisdictions() shows it
+            raise ValueError(f"Unknown jurisdiction: {jurisdiction}")
+        shard_file = (self.shards_dir / file_name).resolve()
+
+        if self.shards_dir.resolve() not in shard_file.parents or not shard_file.is_file():
+            raise ValueError(f"Unknown jurisdiction: {jurisdiction}")
+        return shard_file
+
+    def resident(self, jurisdiction: Optional[str] = None) -> Optional[PermitMatcher]:
+        """
+        Get the matcher for a jurisdiction if it is already in memory
+
+        Never touches the disk, so it can be called from the event loop.
+
+        Args:
+            jurisdiction: Jurisdiction name, None or empty for the default rules
+
+        Returns:
+            PermitMatcher for the jurisdiction, or None if its shard must
+            be loaded with get()
+        """
+        if not jurisdiction:
+            return self.default
+
+        with self._lock:
+            matcher = self._resident.get(jurisdiction)
+            if matcher is not None:
+                self._resident.move_to_end(jurisdiction)
+            return matcher
+
+    def get(self, jurisdiction: Optional[str] = None) -> PermitMatcher:
+        """
+        Get the matcher for a jurisdiction, loading its shard if needed
+
+        Args:
+            jurisdiction: Jurisdiction name, None or empty for the default rules
+
+        Returns:
+            PermitMatcher for the jurisdiction's permit catalog
+        """
+        matcher = self.resident(jurisdiction)
+        if matcher is not None:
+            return matcher
+
+        with self._lock:
+            load_lock = self._loading.setdefault(jurisdiction, threading.Lock())
+
+        with load_lock:
+            try:
+                with self._lock:
+                    # Another request may have loaded it while this one waited
+                    matcher = self._resident.get(jurisdiction)
+                    if matcher is not None:
+                        self._resident.move_to_end(jurisdiction)
+                        return matcher
+
+                started = time.perf_counter()
+                matcher = self.default.spawn(str(self._shard_file(jurisdiction)))
+                logger.info(
+                    f"Loaded {len(matcher.ruleset)} permits for jurisdiction {jurisdiction} "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+                )
+
+                with self._lock:
+                    self.loads += 1
+                    self._resident[jurisdiction] = matcher
+                    while len(self._resident) > self.max_resident:
+                        evicted, _ = self._resident.popitem(last=False)
+                        self.evictions += 1
+                        logger.info(f"Evicted rules for jurisdiction {evicted}")
+
+                return matcher
+            finally:
+                with self._lock:
+                    if self._loading.get(jurisdiction) is load_lock:
+                        del self._loading[jurisdiction]
+
+    def list_jurisdictions(self) -> List[str]:
+        """Names of every jurisdiction with a shard, loaded or not"""
+        if not self.shards_dir.is_dir():
+            return []
+
+        manifest = self._load_manifest()
+        names = set(manifest)
+        names.update(
+            path.stem for path in self.shards_dir.glob('*.json')
+            if path.name != MANIFEST_FILE and path.name not in manifest.values()
+        )
+        return sorted(name for name in names if JURISDICTION_NAME.match(name))
+
+    def info(self) -> Dict[str, Any]:
+        """Resident shards and load/eviction counters"""
+        with self._lock:
+            return {
+                'resident': list(self._resident),
+                'maxResident': self.max_resident,
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
+
+    def reload_if_changed(self) -> None:
+        """Reload every resident shard whose rules file changed"""
+        with self._lock:
+            matchers = list(self._resident.values())
+        for matcher in matchers:
+            matcher.reload_if_changed()
+
+    def watch(self, interval: float = 2.0) -> None:
+        """
+        Start a background thread that reloads changed resident shards
+
+        Args:
+            interval: Seconds between modification time checks
+        """
+        self._watcher.start(interval)
+
+    def stop_watching(self) -> None:
+        """Stop the background watcher started by watch()"""
+        self._watcher.stop()
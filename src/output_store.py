@@ -0,0 +1,361 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from periodic import PeriodicThread
+
+logger = logging.getLogger(__name__)
+
+# Directory under the output directory holding the content-addressed index
+INDEX_DIR_NAME = '.index'
+
+# Shard directory name for the day an output was written
+SHARD_DATE_FORMAT = '%Y-%m-%d'
+
+# Name of the manifest entry of a bundle
+BUNDLE_MANIFEST_NAME = 'manifest.json'
+
+
+# Mode of the files written here, as open() would create them; the umask
+# can only be read by setting it, so it is read once at import
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def shard_dir(output_dir: Path, day: date, permit_id: str) -> Path:
+    """Directory the outputs of a permit written on a day go to"""
+    return output_dir / day.strftime(SHARD_DATE_FORMAT) / permit_id
+
+
+def temp_file_for(path: Path) -> Tuple[int, str]:
+    """
+    Create the temporary file a write to path goes through
+
+    Hidden .tmp name next to path, so nothing watching the directory sees a
+    partial file. mkstemp creates it owner-only; it gets FILE_MODE instead,
+    which os.replace() keeps.
+    """
+    fd, tmp_name = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        os.chmod(tmp_name, FILE_MODE)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_name)
+        raise
+    return fd, tmp_name
+
+
+def write_atomically(path: Path, content: bytes) -> None:
+    """Write a file under a temporary name, then move it into place"""
+    fd, tmp_name = temp_file_for(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+class OutputStore:
+    """
+    Content-addressed index of the filled permits in an output directory
+
+    A fill is identified by a hash of everything that determines its
+    content: the template's digest, the permit id and the full render
+    context (project data plus date fields), normalized. Each key maps to
+    the output file it produced through a small entry file under
+    output_dir/.index, written atomically, so the index survives restarts
+    and is shared by every process filling into the same directory.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.index_dir = output_dir / INDEX_DIR_NAME
+
+    @staticmethod
+    def key(template_digest: str, permit_id: str, context: Dict[str, Any]) -> str:
+        """Hash identifying a fill of a template with a render context"""
+        normalized = json.dumps(
+            [template_digest, permit_id, context],
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(',', ':'),
+            default=str
+        )
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.index_dir / key[:2] / key
+
+    def get(self, key: str) -> Optional[Path]:
+        """Output file previously stored under a key, if it still exists"""
+        entry = self._entry_path(key)
+        try:
+            relative = entry.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+
+        path = self.output_dir / relative
+        if not path.is_file():
+            # The output was deleted; forget it
+            entry.unlink(missing_ok=True)
+            return None
+        return path
+
+    def put(self, key: str, path: Path) -> None:
+        """Record the output file produced for a key"""
+        entry = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        write_atomically(entry, path.relative_to(self.output_dir).as_posix().encode('utf-8'))
+
+
+class BundleWriter:
+    """
+    Zip archive of filled documents, written one entry at a time
+
+    Each entry goes to disk as soon as it is added, so a bundle never holds
+    its documents in memory. The archive is written under a hidden
+    temporary name and moved into place by close(), after the manifest, so
+    nothing watching the directory sees a partial bundle. Documents are
+    stored as they are: a .docx is already compressed.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Where the finished bundle goes; its directory must exist
+        """
+        self.path = path
+        fd, tmp_name = temp_file_for(path)
+        self._tmp_path = Path(tmp_name)
+        self._file = os.fdopen(fd, 'wb')
+        self._archive = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_STORED)
+        self._lock = threading.Lock()
+
+    def _info(self, name: str, size: int) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, datetime.now().timetuple()[:6])
+        info.file_size = size
+        info.external_attr = 0o644 << 16
+        return info
+
+    def add(self, name: str, content: bytes) -> Dict[str, Any]:
+        """
+        Write a document into the bundle
+
+        Returns:
+            The entry's name, size and SHA-256
+        """
+        with self._lock:
+            self._archive.writestr(self._info(name, len(content)), content)
+        return {'file': name, 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest()}
+
+    def add_file(self, name: str, source: Path) -> Dict[str, Any]:
+        """Copy a saved document into the bundle, in chunks; returns as add()"""
+        digest = hashlib.sha256()
+        with self._lock, open(source, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            with self._archive.open(self._info(name, size), 'w') as entry:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+                    entry.write(chunk)
+        return {'file': name, 'size': size, 'sha256': digest.hexdigest()}
+
+    def close(self, manifest: Dict[str, Any]) -> None:
+        """Write the manifest last and move the finished bundle into place"""
+        content = json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            try:
+                self._archive.writestr(self._info(BUNDLE_MANIFEST_NAME, len(content)), content)
+                self._archive.close()
+                self._file.close()
+                os.replace(self._tmp_path, self.path)
+            except BaseException:
+                self._discard()
+                raise
+
+    def abort(self) -> None:
+        """Drop an unfinished bundle"""
+        with self._lock:
+            self._discard()
+
+    def _discard(self) -> None:
+        try:
+            self._archive.close()
+        except Exception:
+            pass
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class OutputSweeper:
+    """
+    Deletes filled permits past their retention age or beyond a size quota
+
+    A sweep lists every output under the directory, deletes those older
+    than max_age, then the oldest remaining ones until the total fits in
+    max_bytes. Files are deleted in batches with a short pause in between,
+    so a large sweep running in the background thread never monopolizes
+    the disk. Emptied shard directories (but not recent ones) and index
+    entries pointing at deleted outputs are removed as well.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        max_age: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        batch_size: int = 200,
+        batch_pause: float = 0.05
+    ):
+        """
+        Args:
+            output_dir: Directory filled permits are saved to
+            max_age: Seconds an output is kept (None to keep them forever)
+            max_bytes: Total size the outputs may take (None for no quota)
+            batch_size: Files deleted between pauses
+            batch_pause: Seconds paused between batches
+        """
+        self.output_dir = output_dir
+        self.index_dir = output_dir / INDEX_DIR_NAME
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+
+        self._lock = threading.Lock()
+        self._stats = {'sweeps': 0, 'deletedFiles': 0, 'reclaimedBytes': 0, 'lastSweep': None}
+        self._sweeper = PeriodicThread(self.sweep, 'output-sweeper', immediately=True)
+
+    def _list_outputs(self) -> List[Tuple[float, int, Path]]:
+        """(modification time, size, path) of every output, oldest first"""
+        outputs = []
+        for root, dirs, files in os.walk(self.output_dir):
+            # Skip the index and anything hidden, such as files being written
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = Path(root) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                outputs.append((stat.st_mtime, stat.st_size, path))
+        outputs.sort()
+        return outputs
+
+    def _expired(self, outputs: List[Tuple[float, int, Path]]) -> List[Tuple[float, int, Path]]:
+        """Split off the oldest outputs that must go to honor the age and the quota"""
+        first = 0
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            while first < len(outputs) and outputs[first][0] < cutoff:
+                first += 1
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in outputs[first:])
+            while first < len(outputs) and total > self.max_bytes:
+                total -= outputs[first][1]
+                first += 1
+
+        expired = outputs[:first]
+        del outputs[:first]
+        return expired
+
+    def _delete(self, expired: List[Tuple[float, int, Path]]) -> Tuple[int, int]:
+        """Delete files in batches; returns (files, bytes) deleted"""
+        files = reclaimed = 0
+        for start in range(0, len(expired), self.batch_size):
+            if start and self._sweeper.stopped.wait(self.batch_pause):
+                break
+            for _, size, path in expired[start:start + self.batch_size]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                files += 1
+                reclaimed += size
+        return files, reclaimed
+
+    def _prune(self) -> None:
+        """Remove index entries of deleted outputs and emptied shard directories"""
+        if self.index_dir.is_dir():
+            for entry in self.index_dir.glob('*/*'):
+                try:
+                    target = self.output_dir / entry.read_text(encoding='utf-8')
+                except OSError:
+                    continue
+                if not target.is_file():
+                    entry.unlink(missing_ok=True)
+
+        # Recent shards are left alone: a fill may be about to write to them
+        # (yesterday's too, for fills running across midnight)
+        recent = (date.today() - timedelta(days=1)).strftime(SHARD_DATE_FORMAT)
+        for root, dirs, files in os.walk(self.output_dir, topdown=False):
+            path = Path(root)
+            if path == self.output_dir or path.name.startswith('.'):
+                continue
+            shard = path.relative_to(self.output_dir).parts[0]
+            if shard < recent and not shard.startswith('.') and not any(path.iterdir()):
+                try:
+                    path.rmdir()
+                except OSError:
+                    pass
+
+    def sweep(self) -> Dict[str, Any]:
+        """
+        Apply the retention age and quota once
+
+        Returns:
+            Files and bytes deleted, what remains, and the sweep's duration
+        """
+        started = time.perf_counter()
+        outputs = self._list_outputs()
+        expired = self._expired(outputs)
+        files, reclaimed = self._delete(expired)
+        self._prune()
+
+        result = {
+            'deletedFiles': files,
+            'reclaimedBytes': reclaimed,
+            'remainingFiles': len(outputs),
+            'remainingBytes': sum(size for _, size, _ in outputs),
+            'elapsedMs': round((time.perf_counter() - started) * 1000, 1)
+        }
+        with self._lock:
+            self._stats['sweeps'] += 1
+            self._stats['deletedFiles'] += files
+            self._stats['reclaimedBytes'] += reclaimed
+            self._stats['lastSweep'] = result
+        if files:
+            logger.info(f"Output sweep deleted {files} files, reclaiming {reclaimed} bytes")
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        """Retention settings and cumulative sweep counters"""
+        with self._lock:
+            return {'maxAge': self.max_age, 'maxBytes': self.max_bytes, **self._stats}
+
+    def watch(self, interval: float = 3600.0) -> None:
+        """
+        Start a background thread that sweeps periodically
+
+        Args:
+            interval: Seconds between sweeps
+        """
+        if self._sweeper.start(interval):
+            logger.info(f"Sweeping {self.output_dir} every {interval}s")
+
+    def stop_watching(self) -> None:
+        """Stop the background sweeper started by watch()"""
+        self._sweeper.stop()
@@ -0,0 +1,71 @@
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class PeriodicThread:
+    """
+    Background daemon thread that calls a function at a fixed interval
+
+    An exception raised by the function is logged and the thread carries
+    on. stopped is set by stop(), so the function itself can wait on it to
+    cut a long run short.
+    """
+
+    def __init__(self, target: Callable[[], Any], name: str, immediately: bool = False):
+        """
+        Args:
+            target: Called with no arguments on every tick
+            name: Name of the thread, also used in error messages
+            immediately: Call the target as soon as the thread starts,
+                rather than one interval later
+        """
+        self.target = target
+        self.name = name
+        self.immediately = immediately
+        self.stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float) -> bool:
+        """
+        Start calling the target every interval seconds
+
+        Returns:
+            False if the thread was already running
+        """
+        if self.running:
+            return False
+
+        self.stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(interval,),
+            name=self.name,
+            daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stop the thread and wait for its current call to finish"""
+        self.stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, interval: float) -> None:
+        if self.immediately:
+            self._call()
+        while not self.stopped.wait(interval):
+            self._call()
+
+    def _call(self) -> None:
+        try:
+            self.target()
+        except Exception as e:
+            logger.error(f"{self.name} error: {e}")
@@ -1,23 +1,214 @@
+import bisect
+import hashlib
 import json
-from typing import List, Dict, Any
+import logging
+import threading
+import time
+from contextvars import ContextVar, Token
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional, Tuple
 from pathlib import Path
 
+from periodic import PeriodicThread
+from permit_matrix import PermitMatrix
+from result_cache import ResultCache
+from rule_set import RuleSet
+from rules_snapshot import load_compiled_rules
+
+logger = logging.getLogger(__name__)
+
+# Joins the descriptions of a batch into one text; never part of a trigger
+BATCH_SEPARATOR = '\x00'
+
+# Rule sets pinned by the current request, per matcher, see PermitMatcher.pin().
+# A single variable for every matcher, since context variables are never freed;
+# the mapping is replaced on each pin, never modified
+_pinned_rulesets: ContextVar[Mapping['PermitMatcher', RuleSet]] = ContextVar(
+    'pinned_rulesets', default=MappingProxyType({})
+)
+
+def _original_offsets(text: str) -> List[int]:
+    """
+    Map offsets in text.lower() back to offsets in text
+    
+    Only needed when lowercasing changes the length of the text (e.g. 'İ'
+    lowercases to two characters); otherwise offsets are identical.
+    """
+    offsets = []
+    for position, char in enumerate(text):
+        offsets.extend([position] * len(char.lower()))
+    offsets.append(len(text))
+    return offsets
+
 class PermitMatcher:
     """Identifies required permits based on project requirements"""
     
-    def __init__(self, rules_file: str):
+    def __init__(
+        self,
+        rules_file: str,
+        engine: str = 'substring',
+        cache_size: int = 1024,
+        snapshot: bool = True,
+        ranking: bool = False,
+        ranking_threshold: float = 0.1,
+        ranking_limit: int = 10
+    ):
+        """
+        Args:
+            rules_file: Path to the permit rules JSON file
+            engine: Trigger matching engine: 'substring' matches a trigger
+                anywhere in the text, 'token' only on whole words
+            cache_size: Number of identify_permits results kept in the LRU
+                cache, 0 to disable it
+            snapshot: Keep a compiled snapshot next to the rules file so later
+                starts skip parsing and compiling the JSON
+            ranking: Build the TF-IDF index used by rank_permits()
+            ranking_threshold: Default minimum relevance score returned by
+                rank_permits()
+            ranking_limit: Default number of permits returned by
+                rank_permits(). Character n-grams give some similarity to
+                most permits, so any threshold low enough to catch loose
+                wording also lets in most of a large catalog; the top few
+                are what a caller can use.
+        """
         self.rules_file = Path(rules_file)
-        self.rules = self._load_rules()
+        self.engine = engine
+        self.snapshot = snapshot
+        self.ranking = ranking
+        self.ranking_threshold = ranking_threshold
+        self.ranking_limit = ranking_limit
+        self._rules_stamp = self._stat_rules()
+        self._ruleset = self._compile_rules()
+        
+        # Results are cached per rule set and dropped whenever it is replaced
+        self._cache = ResultCache(cache_size)
+        self._cache.reset(self._ruleset)
+        
+        self._reload_lock = threading.Lock()
+        self._watcher = PeriodicThread(self.reload_if_changed, 'permit-rules-watcher')
+    
+    @property
+    def ruleset(self) -> RuleSet:
+        """Compiled rule set pinned by the current request, or the latest one"""
+        return _pinned_rulesets.get().get(self, self._ruleset)
+    
+    @property
+    def rules(self) -> Dict[str, Any]:
+        """Raw rules document behind the compiled rule set"""
+        return self.ruleset.rules
     
     def _load_rules(self) -> Dict[str, Any]:
         """Load permit rules from JSON file"""
         with open(self.rules_file, 'r') as f:
             return json.load(f)
     
+    def _compile_rules(self) -> RuleSet:
+        """Compile the rules file, through its on-disk snapshot if enabled"""
+        if self.snapshot:
+            return load_compiled_rules(self.rules_file, self.engine, self.ranking)
+        return RuleSet(self._load_rules(), self.engine, self.ranking)
+    
+    def spawn(self, rules_file: str) -> 'PermitMatcher':
+        """Create a matcher for another rules file with the same settings"""
+        return PermitMatcher(
+            rules_file,
+            engine=self.engine,
+            cache_size=self._cache.maxsize,
+            snapshot=self.snapshot,
+            ranking=self.ranking,
+            ranking_threshold=self.ranking_threshold,
+            ranking_limit=self.ranking_limit
+        )
+    
+    def _stat_rules(self) -> Optional[Tuple[int, int]]:
+        """Modification time and size of the rules file, None if unreadable"""
+        try:
+            stat = self.rules_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def pin(self) -> Token:
+        """
+        Pin the current rule set for the calling request
+        
+        Until unpin() is called, every lookup made from the same task or
+        thread sees this snapshot even if the rules are reloaded meanwhile.
+        Pins of several matchers must be released in reverse order.
+        
+        Returns:
+            Token to pass to unpin()
+        """
+        pinned = _pinned_rulesets.get()
+        return _pinned_rulesets.set(MappingProxyType({**pinned, self: self._ruleset}))
+    
+    def unpin(self, token: Token) -> None:
+        """Release a snapshot pinned with pin()"""
+        _pinned_rulesets.reset(token)
+    
+    def reload(self) -> bool:
+        """
+        Recompile the rules file and swap it in atomically
+        
+        The new rule set is fully built before it replaces the old one, so
+        concurrent lookups see either the old rules or the new ones. If the
+        file cannot be read or compiled the last good rule set is kept.
+        
+        Returns:
+            True if the new rules were swapped in
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            self._rules_stamp = self._stat_rules()
+            
+            try:
+                ruleset = self._compile_rules()
+            except Exception as e:
+                logger.error(
+                    f"Failed to reload rules from {self.rules_file}, "
+                    f"keeping last good rules ({len(self._ruleset)} permits): {e}"
+                )
+                return False
+            
+            self._ruleset = ruleset
+            self._cache.reset(ruleset)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logger.info(
+                f"Reloaded {len(ruleset)} permits from {self.rules_file} "
+                f"in {elapsed_ms:.1f} ms"
+            )
+            return True
+    
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the rules if the file changed since the last (attempted) load
+        
+        Returns:
+            True if new rules were swapped in
+        """
+        if self._stat_rules() == self._rules_stamp:
+            return False
+        return self.reload()
+    
+    def watch(self, interval: float = 2.0) -> None:
+        """
+        Start a background thread that reloads the rules when the file changes
+        
+        Args:
+            interval: Seconds between modification time checks
+        """
+        if self._watcher.start(interval):
+            logger.info(f"Watching {self.rules_file} for changes every {interval}s")
+    
+    def stop_watching(self) -> None:
+        """Stop the background watcher started by watch()"""
+        self._watcher.stop()
+    
     def identify_permits(
         self, 
         project_description: str, 
-        work_types: List[str] = None
+        work_types: List[str] = None,
+        explain: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Identify required permits based on project description and work types
@@ -25,49 +216,206 @@ class PermitMatcher:
         Args:
             project_description: Description of the project work
             work_types: Optional list of work type keywords
+            explain: Also return, for each permit, the triggers that fired
+                and where they occur
             
         Returns:
-            List of required permits with their details
+            List of required permits with their details. Without explain the
+            dicts are shared with the compiled rule set and must not be
+            modified. With explain each permit is a new dict with an extra
+            'matchedTriggers' list of {trigger, text, source, start, end},
+            where source is 'projectDescription' or 'workTypes[i]' and the
+            offsets index into that string.
         """
         if work_types is None:
             work_types = []
         
         # Combine all search text
-        search_text = f"{project_description} {' '.join(work_types)}".lower()
+        combined_text = f"{project_description} {' '.join(work_types)}"
+        search_text = combined_text.lower()
         
-        required_permits = []
+        ruleset = self.ruleset
         
-        for permit in self.rules['permits']:
-            # Check if any trigger matches
-            matches = any(
-                trigger.lower() in search_text 
-                for trigger in permit['triggers']
+        if explain:
+            return self._explain_permits(
+                ruleset,
+                search_text,
+                combined_text,
+                project_description,
+                work_types
             )
-            
-            if matches:
-                required_permits.append({
-                    'id': permit['id'],
-                    'name': permit['name'],
-                    'template': permit['template'],
-                    'requiredFields': permit['requiredFields']
+        
+        key = hashlib.blake2b(
+            search_text.encode('utf-8', 'surrogatepass'),
+            digest_size=16
+        ).digest()
+        
+        cached = self._cache.get(ruleset, key)
+        if cached is None:
+            # One pass over the text finds the triggers of every permit
+            cached = tuple(
+                ruleset.matches[index] for index in ruleset.find_permits(search_text)
+            )
+            self._cache.put(ruleset, key, cached)
+        
+        return list(cached)
+    
+    def _explain_permits(
+        self,
+        ruleset: RuleSet,
+        search_text: str,
+        combined_text: str,
+        project_description: str,
+        work_types: List[str]
+    ) -> List[Dict[str, Any]]:
+        """Build identify_permits(explain=True) results from a single scan"""
+        offsets = None
+        if len(search_text) != len(combined_text):
+            offsets = _original_offsets(combined_text)
+        
+        # Where each field starts in the combined text
+        sources = ['projectDescription']
+        source_starts = [0]
+        position = len(project_description) + 1
+        for index, work_type in enumerate(work_types):
+            sources.append(f'workTypes[{index}]')
+            source_starts.append(position)
+            position += len(work_type) + 1
+        
+        required_permits = []
+        for permit_position, fired in ruleset.explain_permits(search_text).items():
+            matched_triggers = []
+            for trigger_index, start, end in fired:
+                if offsets is not None:
+                    start, end = offsets[start], offsets[end]
+                source = bisect.bisect_right(source_starts, start) - 1
+                base = source_starts[source]
+                matched_triggers.append({
+                    'trigger': ruleset.trigger_labels[trigger_index],
+                    'text': combined_text[start:end],
+                    'source': sources[source],
+                    'start': start - base,
+                    'end': end - base
                 })
+            
+            required_permits.append({
+                **ruleset.matches[permit_position],
+                'matchedTriggers': matched_triggers
+            })
         
         return required_permits
     
+    def identify_permits_many(
+        self,
+        project_descriptions: List[str],
+        work_types: List[str] = None
+    ) -> PermitMatrix:
+        """
+        Identify required permits for many project descriptions at once
+        
+        All descriptions are normalized together and scanned in a single
+        pass, and the result is kept as one bitset per description instead
+        of a list of dicts.
+        
+        Args:
+            project_descriptions: Descriptions of the projects
+            work_types: Optional list of work type keywords applied to every
+                description
+            
+        Returns:
+            Matrix of descriptions x permits; use PermitMatrix.expand() to get
+            the identify_permits result for a row
+        """
+        if work_types is None:
+            work_types = []
+        
+        ruleset = self.ruleset
+        if not project_descriptions:
+            return PermitMatrix(ruleset, [])
+        
+        suffix = f" {' '.join(work_types)}".replace(BATCH_SEPARATOR, ' ')
+        search_text = BATCH_SEPARATOR.join(
+            description.replace(BATCH_SEPARATOR, ' ') + suffix
+            for description in project_descriptions
+        ).lower()
+        
+        return PermitMatrix(ruleset, ruleset.find_permit_bits(search_text, BATCH_SEPARATOR))
+    
+    def rank_permits(
+        self,
+        project_description: str,
+        work_types: List[str] = None,
+        threshold: float = None,
+        limit: int = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank permits by TF-IDF relevance to a free-text project description
+        
+        Unlike identify_permits this does not need an exact trigger phrase:
+        the description is compared to each permit's triggers, name and
+        keywords on character n-grams, so "rewire" still scores against
+        "wiring". Requires the matcher to be created with ranking=True.
+        
+        Args:
+            project_description: Description of the project work
+            work_types: Optional list of work type keywords
+            threshold: Minimum score, defaults to ranking_threshold
+            limit: Maximum number of permits to return, defaults to
+                ranking_limit
+            
+        Returns:
+            Permits as returned by identify_permits plus a 'score', best first
+        """
+        return self.rank_permits_many(
+            [project_description],
+            work_types,
+            threshold,
+            limit
+        )[0]
+    
+    def rank_permits_many(
+        self,
+        project_descriptions: List[str],
+        work_types: List[str] = None,
+        threshold: float = None,
+        limit: int = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Rank permits for many descriptions with a single sparse product
+        
+        Returns:
+            One rank_permits() result per description
+        """
+        if work_types is None:
+            work_types = []
+        if threshold is None:
+            threshold = self.ranking_threshold
+        if limit is None:
+            limit = self.ranking_limit
+        
+        ruleset = self.ruleset
+        suffix = f" {' '.join(work_types)}"
+        ranked = ruleset.rank(
+            [f"{description}{suffix}".lower() for description in project_descriptions],
+            threshold,
+            limit,
+            decimals=4
+        )
+        
+        matches = ruleset.matches
+        return [
+            [{**matches[position], 'score': score} for position, score in permits]
+            for permits in ranked
+        ]
+    
+    def cache_info(self) -> Dict[str, int]:
+        """Hit, miss, eviction and invalidation counters of the result cache"""
+        return self._cache.info()
+    
     def get_permit_by_id(self, permit_id: str) -> Dict[str, Any]:
         """Get permit details by ID"""
-        for permit in self.rules['permits']:
-            if permit['id'] == permit_id:
-                return permit
-        return None
+        return self.ruleset.get_permit(permit_id)
     
     def list_all_permits(self) -> List[Dict[str, Any]]:
         """List all available permits"""
-        return [
-            {
-                'id': permit['id'],
-                'name': permit['name'],
-                'triggers': permit['triggers']
-            }
-            for permit in self.rules['permits']
-        ]
\ No newline at end of file
+        return list(self.ruleset.summaries)
\ No newline at end of file
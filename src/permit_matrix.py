@@ -0,0 +1,56 @@
+from typing import Any, Dict, Iterator, List, Tuple
+
+from rule_set import RuleSet
+
+class PermitMatrix:
+    """
+    Boolean descriptions x permits matrix from a batch identification
+
+    Each row is packed into a single int used as a bitset: bit j is set when
+    the description needs the j-th permit of the rule set. Rows are only
+    expanded into permit dicts on request.
+    """
+
+    __slots__ = ('ruleset', 'rows')
+
+    def __init__(self, ruleset: RuleSet, rows: List[int]):
+        self.ruleset = ruleset
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(number of descriptions, number of permits)"""
+        return len(self.rows), len(self.ruleset)
+
+    def get(self, row: int, column: int) -> bool:
+        """Whether description `row` needs the permit in position `column`"""
+        return bool(self.rows[row] >> column & 1)
+
+    def columns(self, row: int) -> Iterator[int]:
+        """Positions of the permits a description needs, in rules file order"""
+        bits = self.rows[row]
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def permit_ids(self, row: int) -> List[str]:
+        """IDs of the permits a description needs"""
+        permits = self.ruleset.permits
+        return [permits[column]['id'] for column in self.columns(row)]
+
+    def expand(self, row: int) -> List[Dict[str, Any]]:
+        """Expand a row into the list returned by identify_permits"""
+        matches = self.ruleset.matches
+        return [matches[column] for column in self.columns(row)]
+
+    def counts(self) -> List[int]:
+        """Number of descriptions that need each permit"""
+        totals = [0] * len(self.ruleset)
+        for row in range(len(self.rows)):
+            for column in self.columns(row):
+                totals[column] += 1
+        return totals
@@ -0,0 +1,205 @@
+import math
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from token_index import tokenize
+
+# Character n-gram length; short enough that "rewire" and "wiring" share "wir"
+NGRAM_SIZE = 3
+
+# Upper bound on the cells of the dense score block computed at once
+MAX_SCORE_CELLS = 1 << 22
+
+
+def ngram_counts(text: str) -> Counter:
+    """
+    Count the character n-grams of every word
+
+    Words are not padded: boundary n-grams such as " re" or "ed " are shared
+    by far too many unrelated words and drown out the inner ones that link
+    "rewire" to "wiring". Words shorter than an n-gram count whole.
+    """
+    counts = Counter()
+    for token in tokenize(text):
+        if len(token) < NGRAM_SIZE:
+            counts[token] += 1
+            continue
+        counts.update(
+            token[start:start + NGRAM_SIZE]
+            for start in range(len(token) - NGRAM_SIZE + 1)
+        )
+    return counts
+
+
+class RelevanceIndex:
+    """
+    Sparse TF-IDF matrix over permit documents
+
+    Each permit document (its triggers, name and keywords) becomes an
+    L2-normalized vector of sublinear TF x smoothed IDF weights over character
+    n-grams. The matrix is stored column-wise (CSC: one run of permit
+    positions and weights per n-gram), so scoring a batch of descriptions
+    only reads the n-gram columns the descriptions contain, once per batch,
+    and multiplies them with the descriptions in one dense product.
+    """
+
+    def __init__(self, documents: Sequence[str]):
+        """
+        Build the matrix
+
+        Args:
+            documents: One text per permit, in rules file order
+        """
+        self.size = len(documents)
+
+        counts = [ngram_counts(document) for document in documents]
+        document_frequency = Counter()
+        for document_counts in counts:
+            document_frequency.update(document_counts.keys())
+
+        self.vocabulary = {ngram: feature for feature, ngram in enumerate(document_frequency)}
+        frequencies = np.fromiter(document_frequency.values(), dtype=np.float64)
+        self.idf = np.log((1 + self.size) / (1 + frequencies)) + 1
+
+        rows, columns, values = [], [], []
+        for position, document_counts in enumerate(counts):
+            features, weights = self._vectorize(document_counts)
+            rows.append(np.full(len(features), position, dtype=np.int32))
+            columns.append(features)
+            values.append(weights)
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+        values = np.concatenate(values) if values else np.empty(0, dtype=np.float64)
+
+        order = np.lexsort((rows, columns))
+        self.indices = rows[order]
+        self.data = values[order]
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=len(self.vocabulary)), out=self.indptr[1:])
+
+    def _vectorize(self, counts: Counter) -> Tuple[np.ndarray, np.ndarray]:
+        """L2-normalized TF-IDF vector of the n-grams known to the index"""
+        vocabulary = self.vocabulary
+        known = [(vocabulary[ngram], count) for ngram, count in counts.items() if ngram in vocabulary]
+        if not known:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        features = np.fromiter((feature for feature, _ in known), dtype=np.int64, count=len(known))
+        tf = np.fromiter((count for _, count in known), dtype=np.float64, count=len(known))
+        weights = (1 + np.log(tf)) * self.idf[features]
+        return features, weights / math.sqrt(float(weights @ weights))
+
+    def _score_block(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Score a block of texts with one dense product
+
+        The n-gram columns the block uses are expanded once for the whole
+        block, however many of its texts share them, into dense slabs of at
+        most MAX_SCORE_CELLS cells.
+        """
+        query_rows, query_features, query_weights = [], [], []
+        for row, text in enumerate(texts):
+            features, weights = self._vectorize(ngram_counts(text))
+            query_rows.append(np.full(len(features), row, dtype=np.int64))
+            query_features.append(features)
+            query_weights.append(weights)
+
+        query_rows = np.concatenate(query_rows)
+        query_features = np.concatenate(query_features)
+        query_weights = np.concatenate(query_weights)
+
+        # Dense queries over just the n-grams this block uses
+        used = np.unique(query_features)
+        queries = np.zeros((len(texts), len(used)))
+        queries[query_rows, np.searchsorted(used, query_features)] = query_weights
+
+        scores = np.zeros((len(texts), self.size))
+        chunk = max(1, MAX_SCORE_CELLS // self.size)
+        for first in range(0, len(used), chunk):
+            features = used[first:first + chunk]
+            starts = self.indptr[features]
+            lengths = self.indptr[features + 1] - starts
+            ends = np.cumsum(lengths)
+            entries = np.repeat(starts - (ends - lengths), lengths) + np.arange(ends[-1])
+
+            columns = np.zeros((len(features), self.size))
+            columns[np.repeat(np.arange(len(features)), lengths), self.indices[entries]] = self.data[entries]
+            scores += queries[:, first:first + chunk] @ columns
+        return scores
+
+    def rank_many(
+        self,
+        texts: Sequence[str],
+        threshold: float,
+        limit: Optional[int] = None,
+        decimals: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Rank the permits for every text
+
+        Args:
+            texts: Texts to score
+            threshold: Minimum score for a permit to be returned
+            limit: Maximum number of permits per text
+            decimals: Round the returned scores to this many decimals
+
+        Returns:
+            Per text, (permit position, score) pairs by decreasing score
+
+        Raises:
+            ValueError: If limit is less than 1
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+        if not texts or not self.size:
+            return [[] for _ in texts]
+
+        ranked = []
+        block = max(1, MAX_SCORE_CELLS // self.size)
+        for first in range(0, len(texts), block):
+            ranked += self._rank_block(self._score_block(texts[first:first + block]), threshold, limit, decimals)
+        return ranked
+
+    def _rank_block(
+        self,
+        scores: np.ndarray,
+        threshold: float,
+        limit: Optional[int],
+        decimals: Optional[int]
+    ) -> List[List[Tuple[int, float]]]:
+        """Threshold, select, sort and round a whole block of scores at once"""
+        # Sort keys: negated scores, with permits below the threshold last
+        keys = np.where((scores >= threshold) & (scores > 0), -scores, np.inf)
+        kept = np.count_nonzero(keys < np.inf, axis=1)
+
+        if limit is None or limit >= self.size:
+            top = np.argsort(keys, axis=1, kind='stable')
+            top_keys = np.take_along_axis(keys, top, axis=1)
+        else:
+            kept = np.minimum(kept, limit)
+            top = np.argpartition(keys, limit - 1, axis=1)[:, :limit]
+            top_keys = np.take_along_axis(keys, top, axis=1)
+            order = np.lexsort((top, top_keys), axis=-1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_keys = np.take_along_axis(top_keys, order, axis=1)
+
+            # argpartition splits ties at the cutoff arbitrarily; those rows
+            # get the lowest positions, as a full sort would give them
+            cutoff = top_keys[:, -1:]
+            split = (cutoff[:, 0] < np.inf) & (
+                np.count_nonzero(keys == cutoff, axis=1) > np.count_nonzero(top_keys == cutoff, axis=1)
+            )
+            for row in np.flatnonzero(split):
+                top[row] = np.argsort(keys[row], kind='stable')[:limit]
+                top_keys[row] = keys[row, top[row]]
+
+        top_scores = -top_keys
+        if decimals is not None:
+            top_scores = np.round(top_scores, decimals)
+        return [
+            list(zip(top[row, :count].tolist(), top_scores[row, :count].tolist()))
+            for row, count in enumerate(kept.tolist())
+        ]
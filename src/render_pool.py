@@ -0,0 +1,267 @@
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Executor, Future
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerCrashedError(RuntimeError):
+    """A render worker process died while running a job"""
+
+
+class WorkerInitError(RuntimeError):
+    """A render worker's initializer raised, so it cannot run jobs"""
+
+
+def _resident_memory() -> Optional[int]:
+    """Resident memory of this process in bytes, or None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current usage, but still bounds the worker
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _worker_main(conn, initializer, initargs, max_memory) -> None:
+    """
+    Run calls received over the connection until told to stop
+
+    A worker whose initializer failed stays up and fails every call with
+    WorkerInitError, rather than exiting and being restarted in a loop.
+    """
+    init_error = None
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except BaseException as e:
+            init_error = WorkerInitError(f"Render worker initializer failed: {e!r}")
+
+    while True:
+        try:
+            call = conn.recv()
+        except EOFError:
+            return
+        if call is None:
+            return
+
+        if init_error is not None:
+            conn.send((False, init_error, False))
+            continue
+
+        fn, args, kwargs = call
+        try:
+            reply = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            reply = (False, e)
+
+        memory = _resident_memory() if max_memory is not None else None
+        recycle = memory is not None and memory > max_memory
+        try:
+            conn.send(reply + (recycle,))
+        except Exception as e:
+            # The result or the exception could not be pickled
+            conn.send((False, RuntimeError(f"Unpicklable render result: {e!r}"), recycle))
+        if recycle:
+            return
+
+
+class _Worker:
+    """A worker process and the thread in this process that feeds it jobs"""
+
+    def __init__(self, pool: 'RenderPool', number: int):
+        self.pool = pool
+        self.number = number
+        self.process = None
+        self.conn = None
+        self.start_process()
+        self.thread = threading.Thread(
+            target=self.run, name=f'render-worker-{number}', daemon=True
+        )
+        self.thread.start()
+
+    def start_process(self) -> None:
+        parent_conn, child_conn = self.pool._context.Pipe()
+        self.process = self.pool._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.pool._initializer, self.pool._initargs, self.pool._max_memory),
+            name=f'render-worker-{self.number}',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def restart_process(self) -> None:
+        self.conn.close()
+        self.process.join()
+        self.start_process()
+
+    def run(self) -> None:
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            future, call = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            # A worker killed while idle is replaced before it gets a job
+            if not self.process.is_alive():
+                self.pool._count('crashed')
+                logger.warning(f"Render worker {self.process.pid} died while idle; restarting it")
+                self.restart_process()
+
+            self.execute(future, call)
+
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join()
+        self.conn.close()
+
+    def execute(self, future: Future, call: Tuple[Callable, tuple, dict]) -> None:
+        try:
+            self.conn.send(call)
+        except Exception as e:
+            if self.process.is_alive():
+                # The call itself could not be pickled
+                future.set_exception(e)
+                return
+
+        ready = wait([self.conn, self.process.sentinel])
+        reply = None
+        if self.conn in ready:
+            try:
+                reply = self.conn.recv()
+            except (EOFError, OSError):
+                pass
+
+        if reply is None:
+            self.process.join()
+            self.pool._count('crashed')
+            logger.warning(
+                f"Render worker {self.process.pid} exited with code {self.process.exitcode}; restarting it"
+            )
+            error = WorkerCrashedError(f"Render worker exited with code {self.process.exitcode}")
+            self.restart_process()
+            future.set_exception(error)
+            return
+
+        ok, value, recycle = reply
+        self.pool._count('completed')
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+        if recycle:
+            self.pool._count('recycled')
+            logger.info(f"Render worker {self.process.pid} exceeded its memory limit; replacing it")
+            self.restart_process()
+
+
+class RenderPool(Executor):
+    """
+    Pool of pre-forked worker processes that stay warm between jobs
+
+    All workers are started up front and run the initializer once (to load
+    templates, typically), then execute submitted calls one at a time. A
+    worker that dies is restarted and the job it was running fails with
+    WorkerCrashedError; a worker whose resident memory exceeds the limit
+    after a job is replaced before it takes another. A worker whose
+    initializer raised fails its jobs with WorkerInitError instead.
+
+    Calls and their results are pickled, so submit module-level functions.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+        max_memory: Optional[int] = None,
+        mp_context=None
+    ):
+        """
+        Start the workers
+
+        Args:
+            max_workers: Number of worker processes (defaults to the CPU count)
+            initializer: Called with initargs in each worker when it starts
+            initargs: Arguments for the initializer
+            max_memory: Resident bytes after which a worker is replaced
+            mp_context: multiprocessing context the workers are started from
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self._context = mp_context or multiprocessing.get_context()
+        self._initializer = initializer
+        self._initargs = initargs
+        self._max_memory = max_memory
+
+        self._jobs: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._stats = {'completed': 0, 'crashed': 0, 'recycled': 0}
+        self._workers = [_Worker(self, number) for number in range(max_workers)]
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new renders after shutdown")
+            future = Future()
+            self._jobs.put((future, (fn, args, kwargs)))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+
+        if cancel_futures:
+            while True:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                job[0].cancel()
+
+        # Queued jobs run first; each worker then stops at its sentinel
+        for _ in self._workers:
+            self._jobs.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.thread.join()
+
+    def info(self) -> Dict[str, Any]:
+        """Worker count, pids and job/restart counters"""
+        with self._lock:
+            return {
+                'workers': len(self._workers),
+                'pids': [worker.process.pid for worker in self._workers],
+                'queued': self._jobs.qsize(),
+                **self._stats
+            }
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class ResultCache:
+    """
+    Thread-safe bounded LRU cache tied to one owner object
+
+    Entries are only valid for the owner they were stored under (e.g. the
+    compiled rule set that produced them). reset() switches to a new owner
+    and drops everything; lookups and stores made on behalf of any other
+    owner bypass the cache.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._owner: Any = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def reset(self, owner: Any) -> None:
+        """Drop every entry and start caching results for a new owner"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._owner = owner
+
+    def get(self, owner: Any, key: Hashable) -> Optional[Any]:
+        """Return the cached value for the key, or None on a miss"""
+        with self._lock:
+            if owner is self._owner:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, owner: Any, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            if owner is not self._owner:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def info(self) -> Dict[str, int]:
+        """Counters and current size of the cache"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
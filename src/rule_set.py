@@ -0,0 +1,206 @@
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+from relevance_index import RelevanceIndex
+from token_index import TokenIndex
+from trigger_automaton import substring_matcher
+
+# Trigger matching engines, by the name used in PermitMatcher(engine=...)
+ENGINES = {
+    'substring': substring_matcher,
+    'token': TokenIndex,
+}
+
+class RuleSet:
+    """
+    Compiled, read-only snapshot of the permit rules
+
+    Everything a lookup needs is computed once here, so the query methods
+    never walk the raw permit list or build new dicts. The projections are
+    shared between callers and must not be mutated.
+    """
+
+    __slots__ = (
+        'rules',
+        'permits',
+        'triggers',
+        'index',
+        'summaries',
+        'matches',
+        'engine',
+        'trigger_index',
+        'relevance',
+        'trigger_owners',
+        'trigger_labels',
+    )
+
+    def __init__(
+        self,
+        rules: Dict[str, Any],
+        engine: str = 'substring',
+        ranking: bool = False
+    ):
+        """
+        Compile a rules document loaded from permit_rules.json
+
+        Args:
+            rules: Parsed rules document with a 'permits' list
+            engine: Trigger matching engine, 'substring' (a trigger matches
+                anywhere in the text) or 'token' (whole words only)
+            ranking: Also build the TF-IDF relevance index used by rank()
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown matching engine: {engine}")
+
+        self.rules = rules
+        self.engine = engine
+        self.permits: Tuple[Dict[str, Any], ...] = tuple(rules['permits'])
+
+        # Pre-lowered triggers, one tuple per permit
+        self.triggers: Tuple[Tuple[str, ...], ...] = tuple(
+            tuple(trigger.lower() for trigger in permit['triggers'])
+            for permit in self.permits
+        )
+
+        # id -> permit; the first permit wins on duplicate ids, as the
+        # linear scan it replaces did
+        index = {}
+        for permit in self.permits:
+            index.setdefault(permit['id'], permit)
+        self.index = MappingProxyType(index)
+
+        # Projections returned by list_all_permits and identify_permits
+        self.summaries: Tuple[Dict[str, Any], ...] = tuple(
+            {
+                'id': permit['id'],
+                'name': permit['name'],
+                'triggers': permit['triggers']
+            }
+            for permit in self.permits
+        )
+        self.matches: Tuple[Dict[str, Any], ...] = tuple(
+            {
+                'id': permit['id'],
+                'name': permit['name'],
+                'template': permit['template'],
+                'requiredFields': permit['requiredFields']
+            }
+            for permit in self.permits
+        )
+
+        patterns = []
+        trigger_owners = []
+        for position, triggers in enumerate(self.triggers):
+            patterns.extend(triggers)
+            trigger_owners.extend([position] * len(triggers))
+        self.trigger_owners: Tuple[int, ...] = tuple(trigger_owners)
+        # Triggers as written in the rules file, for explanations
+        self.trigger_labels: Tuple[str, ...] = tuple(
+            trigger for permit in self.permits for trigger in permit['triggers']
+        )
+        self.trigger_index = ENGINES[engine](patterns)
+
+        # One document per permit: its triggers, name and optional keywords,
+        # lowercased like the texts they are ranked against
+        self.relevance: Optional[RelevanceIndex] = None
+        if ranking:
+            self.relevance = RelevanceIndex([
+                ' '.join([*permit['triggers'], permit['name'], *permit.get('keywords', [])]).lower()
+                for permit in self.permits
+            ])
+
+    def __len__(self) -> int:
+        return len(self.permits)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # MappingProxyType cannot be pickled; store the underlying dict
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state['index'] = dict(self.index)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.index = MappingProxyType(self.index)
+
+    def get_permit(self, permit_id: str) -> Optional[Dict[str, Any]]:
+        """Get the raw permit definition by ID"""
+        return self.index.get(permit_id)
+
+    def find_permits(self, search_text: str) -> List[int]:
+        """
+        Find the permits whose triggers occur in the search text
+
+        Args:
+            search_text: Lowercased text to scan
+
+        Returns:
+            Positions of the matched permits, in rules file order
+        """
+        owners = self.trigger_owners
+        return sorted({owners[index] for index in self.trigger_index.find(search_text)})
+
+    def explain_permits(self, search_text: str) -> Dict[int, List[Tuple[int, int, int]]]:
+        """
+        Find the matched permits together with the triggers that fired
+
+        Args:
+            search_text: Lowercased text to scan
+
+        Returns:
+            Permit position -> (trigger index, start, end) for every trigger
+            occurrence, from a single scan of the text. Iterating the dict
+            gives the permits in rules file order.
+        """
+        owners = self.trigger_owners
+        fired: Dict[int, List[Tuple[int, int, int]]] = {}
+        for index, start, end in self.trigger_index.scan(search_text):
+            fired.setdefault(owners[index], []).append((index, start, end))
+        return {position: fired[position] for position in sorted(fired)}
+
+    def find_permit_bits(self, search_text: str, separator: str) -> List[int]:
+        """
+        Find the permits for many texts joined by a separator, in one scan
+
+        Args:
+            search_text: Lowercased texts joined by the separator
+            separator: Character that occurs in no trigger
+
+        Returns:
+            One bitset per text, with bit j set when the j-th permit matched
+        """
+        owners = self.trigger_owners
+        size = (len(self.permits) + 7) // 8
+        rows = []
+        for found in self.trigger_index.find_segments(search_text, separator):
+            # Set each matched permit's bit in a byte buffer, then convert
+            # the whole row to an int once
+            row = bytearray(size)
+            for owner in {owners[index] for index in found}:
+                row[owner >> 3] |= 1 << (owner & 7)
+            rows.append(int.from_bytes(row, 'little'))
+        return rows
+
+    def rank(
+        self,
+        search_texts: List[str],
+        threshold: float,
+        limit: Optional[int] = None,
+        decimals: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Rank the permits by TF-IDF relevance to each text
+
+        Args:
+            search_texts: Texts to score, all in one sparse product
+            threshold: Minimum cosine similarity for a permit to be returned
+            limit: Maximum number of permits per text
+            decimals: Round the returned scores to this many decimals
+
+        Returns:
+            Per text, (permit position, score) pairs by decreasing score
+        """
+        if self.relevance is None:
+            raise ValueError("Relevance ranking is not enabled for these rules")
+
+        return self.relevance.rank_many(search_texts, threshold, limit, decimals)
@@ -0,0 +1,146 @@
+import gc
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from rule_set import RuleSet
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of RuleSet or the matching engines changes
+SNAPSHOT_VERSION = 6
+
+SNAPSHOT_SUFFIX = '.snapshot'
+
+
+def snapshot_path(rules_file: Path, engine: str, ranking: bool = False) -> Path:
+    """
+    Location of the compiled snapshot for a rules file
+
+    Each engine and ranking combination gets its own file, e.g.
+    permit_rules.json.token.ranking.snapshot, so matchers with different
+    settings do not keep overwriting each other's snapshot.
+    """
+    variant = f".{engine}.ranking" if ranking else f".{engine}"
+    return rules_file.with_name(rules_file.name + variant + SNAPSHOT_SUFFIX)
+
+
+def _read_snapshot(snapshot_file: Path) -> Tuple[Optional[Dict[str, Any]], Optional[io.BytesIO]]:
+    """
+    Read a snapshot with a single read and unpickle only its header
+
+    Returns:
+        (header, stream positioned at the pickled RuleSet), or (None, None)
+        if there is no usable snapshot
+    """
+    try:
+        stream = io.BytesIO(snapshot_file.read_bytes())
+        header = pickle.load(stream)
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable rules snapshot {snapshot_file}: {e}")
+        return None, None
+
+    if not isinstance(header, dict) or header.get('version') != SNAPSHOT_VERSION:
+        return None, None
+    return header, stream
+
+
+def _write_snapshot(snapshot_file: Path, header: Dict[str, Any], ruleset: RuleSet) -> None:
+    """Atomically write a snapshot next to the rules file"""
+    try:
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=snapshot_file.name, suffix='.tmp', dir=snapshot_file.parent
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(ruleset, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, snapshot_file)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    except OSError as e:
+        # A read-only data directory only costs the speedup
+        logger.warning(f"Could not write rules snapshot {snapshot_file}: {e}")
+
+
+def _unpickle(stream: io.BytesIO) -> RuleSet:
+    """Unpickle a rule set with the cyclic GC paused"""
+    # Unpickling allocates hundreds of thousands of small containers, which
+    # would otherwise trigger many useless collections along the way
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.load(stream)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def load_compiled_rules(rules_file: Path, engine: str, ranking: bool = False) -> RuleSet:
+    """
+    Get the compiled rule set for a rules file, reusing its snapshot when fresh
+
+    The snapshot records the SHA-256 of the rules file, which is hashed on
+    every load (a few milliseconds even for large files): a file rewritten
+    with the same size and modification time, as cp -p or a tar extract
+    leave it, must still be recompiled. The file's modification time and
+    size are recorded too, only to tell when an otherwise fresh snapshot's
+    header needs rewriting.
+
+    The snapshot is a pickle, so it must only live where the rules file
+    itself is trusted.
+
+    Args:
+        rules_file: Path to the permit rules JSON file
+        engine: Trigger matching engine the rule set is compiled for
+        ranking: Whether the rule set needs its relevance index
+
+    Returns:
+        Compiled rule set
+    """
+    stat = rules_file.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    snapshot_file = snapshot_path(rules_file, engine, ranking)
+
+    header, stream = _read_snapshot(snapshot_file)
+    if header is not None and (header.get('engine'), header.get('ranking')) != (engine, ranking):
+        header = None
+
+    raw = rules_file.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+
+    ruleset = None
+    if header is not None and header.get('sha256') == digest:
+        try:
+            ruleset = _unpickle(stream)
+        except Exception as e:
+            logger.warning(f"Ignoring corrupt rules snapshot {snapshot_file}: {e}")
+        else:
+            if header.get('stamp') == stamp:
+                return ruleset
+            # Same content, only the file's timestamp changed
+
+    if ruleset is None:
+        ruleset = RuleSet(json.loads(raw), engine, ranking)
+
+    _write_snapshot(
+        snapshot_file,
+        {
+            'version': SNAPSHOT_VERSION,
+            'engine': engine,
+            'ranking': ranking,
+            'stamp': stamp,
+            'sha256': digest
+        },
+        ruleset
+    )
+    return ruleset
@@ -1,4 +1,5 @@
 import asyncio
+import base64
 import json
 import sys
 import traceback
@@ -32,7 +33,9 @@ except Exception as e:
 
 try:
     from permit_matcher import PermitMatcher
-    from form_filler import FormFiller
+    from jurisdictions import JurisdictionRouter
+    from form_filler import AUTO_FILLED_FIELDS, FormFiller
+    from output_store import OutputSweeper
     logger.info("Local imports successful")
 except Exception as e:
     logger.error(f"Failed to import local modules: {e}")
@@ -44,11 +47,69 @@ BASE_DIR = Path(__file__).parent.parent
 TEMPLATES_DIR = BASE_DIR / "templates"
 OUTPUT_DIR = BASE_DIR / "output"
 RULES_FILE = BASE_DIR / "data" / "permit_rules.json"
+JURISDICTIONS_DIR = BASE_DIR / "data" / "jurisdictions"
+BULK_INPUT_DIR = BASE_DIR / "data" / "bulk"
+
+# Seconds between checks of the rules file for changes
+RULES_RELOAD_INTERVAL = 2.0
+
+# Trigger matching engine: "substring" or "token" (whole words only)
+MATCH_ENGINE = "substring"
+
+# Number of identify_permits results kept in the matcher's LRU cache
+MATCH_CACHE_SIZE = 1024
+
+# Minimum TF-IDF relevance score returned by rank_permits
+RANKING_THRESHOLD = 0.1
+
+# Number of permits returned by rank_permits unless the call asks for more
+RANKING_LIMIT = 10
+
+# Number of compiled jurisdiction rule sets kept in memory
+MAX_RESIDENT_JURISDICTIONS = 8
+
+# Where permit forms are rendered, off the event loop: "thread" or "process"
+RENDER_EXECUTOR = "thread"
+
+# Number of concurrent renders (None for the executor's default)
+RENDER_WORKERS = 4
+
+# Resident memory after which a "process" render worker is replaced
+RENDER_WORKER_MEMORY_LIMIT = 512 * 1024 * 1024
+
+# Largest filled document returned in a response; bigger ones are saved to OUTPUT_DIR
+INLINE_DOCUMENT_MAX_BYTES = 5 * 1024 * 1024
+
+# Return the existing output of an identical earlier fill instead of rendering again
+DEDUPLICATE_OUTPUTS = True
+
+# Days filled permits are kept in OUTPUT_DIR after they were last written or
+# reused by deduplication (None to keep them forever)
+OUTPUT_RETENTION_DAYS = 30
+
+# Total size filled permits may take in OUTPUT_DIR (None for no quota)
+OUTPUT_MAX_BYTES = 5 * 1024 ** 3
+
+# Seconds between retention sweeps of OUTPUT_DIR
+OUTPUT_SWEEP_INTERVAL = 3600.0
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Renders in flight at once for a single fill_all_required_permits call
+FILL_ALL_CONCURRENCY = 4
+
+# Renders in flight at once for a fill_permits_bulk call
+BULK_FILL_CONCURRENCY = 8
+
+# Failed results listed in the fill_permits_bulk summary
+BULK_MAX_REPORTED_FAILURES = 20
 
 logger.info(f"Base directory: {BASE_DIR}")
 logger.info(f"Templates directory: {TEMPLATES_DIR}")
 logger.info(f"Output directory: {OUTPUT_DIR}")
 logger.info(f"Rules file: {RULES_FILE}")
+logger.info(f"Jurisdictions directory: {JURISDICTIONS_DIR}")
+logger.info(f"Bulk input directory: {BULK_INPUT_DIR}")
 
 # Verify paths exist
 if not RULES_FILE.exists():
@@ -65,14 +126,57 @@ if not OUTPUT_DIR.exists():
 
 # Initialize components
 try:
-    permit_matcher = PermitMatcher(str(RULES_FILE))
-    form_filler = FormFiller(str(TEMPLATES_DIR), str(OUTPUT_DIR))
+    permit_matcher = PermitMatcher(
+        str(RULES_FILE),
+        MATCH_ENGINE,
+        MATCH_CACHE_SIZE,
+        ranking=True,
+        ranking_threshold=RANKING_THRESHOLD,
+        ranking_limit=RANKING_LIMIT
+    )
+    form_filler = FormFiller(
+        str(TEMPLATES_DIR),
+        str(OUTPUT_DIR),
+        RENDER_EXECUTOR,
+        RENDER_WORKERS,
+        RENDER_WORKER_MEMORY_LIMIT,
+        INLINE_DOCUMENT_MAX_BYTES,
+        DEDUPLICATE_OUTPUTS
+    )
+    form_filler.start()
+    output_sweeper = OutputSweeper(
+        OUTPUT_DIR,
+        OUTPUT_RETENTION_DAYS * 86400 if OUTPUT_RETENTION_DAYS is not None else None,
+        OUTPUT_MAX_BYTES
+    )
+    output_sweeper.watch(OUTPUT_SWEEP_INTERVAL)
+    for problem in form_filler.check_templates(permit_matcher.ruleset.permits):
+        logger.warning(f"Permit rules and template disagree: {json.dumps(problem)}")
+    permit_matcher.watch(RULES_RELOAD_INTERVAL)
+    permit_router = JurisdictionRouter(
+        str(JURISDICTIONS_DIR),
+        permit_matcher,
+        MAX_RESIDENT_JURISDICTIONS
+    )
+    permit_router.watch(RULES_RELOAD_INTERVAL)
     logger.info("Components initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize components: {e}")
     logger.error(traceback.format_exc())
     sys.exit(1)
 
+# Optional argument accepted by every tool
+JURISDICTION_PROPERTY = {
+    "type": "string",
+    "description": "Jurisdiction whose permit catalog to use (omit for the default catalog)"
+}
+
+# Optional argument of the fill tools
+RETURN_DOCUMENT_PROPERTY = {
+    "type": "boolean",
+    "description": "Return filled documents in the response instead of saving them on the server (documents over the size cap are still saved)"
+}
+
 # Create server instance
 server = Server("permit-form-filler")
 logger.info("Server instance created")
@@ -133,6 +237,229 @@ def _format_field_name(field):
     
     return field_name
 
+def _document_resource(result):
+    """Move an in-memory fill's content out of its result into an embedded resource"""
+    content = result.pop('content')
+    return types.EmbeddedResource(
+        type="resource",
+        resource=types.BlobResourceContents(
+            uri=f"permit-form://filled/{result['outputFile']}",
+            mimeType=DOCX_MIME_TYPE,
+            blob=base64.b64encode(content).decode('ascii')
+        )
+    )
+
+async def _fill_permits(permits, project_data, in_memory=False, on_result=None):
+    """
+    Validate and fill several permits, rendering up to FILL_ALL_CONCURRENCY at once
+    
+    Each permit's failure is reported in its own result, so one failing
+    template does not cancel the others. Results are in the order of permits;
+    on_result, if given, is awaited with each permit and its result as soon
+    as that permit is done.
+    """
+    semaphore = asyncio.Semaphore(FILL_ALL_CONCURRENCY)
+    
+    async def fill(permit):
+        try:
+            # Validate fields
+            validation = form_filler.validate_required_fields(
+                project_data,
+                permit['requiredFields']
+            )
+            
+            if not validation['valid']:
+                return {
+                    "success": False,
+                    "permitId": permit['id'],
+                    "permitName": permit['name'],
+                    "error": "Missing required fields",
+                    "missingFields": validation['missingFields']
+                }
+            
+            # Fill permit
+            async with semaphore:
+                result = await form_filler.fill_permit_async(
+                    permit['template'],
+                    permit['id'],
+                    permit['name'],
+                    project_data,
+                    in_memory
+                )
+            if on_result is not None:
+                await on_result(permit, result)
+            return result
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "permitId": permit['id'],
+                "error": str(e)
+            }
+    
+    return await asyncio.gather(*(fill(permit) for permit in permits))
+
+async def _fill_bundle(permits, project_data, project_description):
+    """
+    Validate and fill several permits into one project zip bundle
+    
+    Each filled document is written into the bundle as soon as its render
+    finishes, then dropped; the manifest listing every permit with its
+    validation status and checksum is written last.
+    
+    Returns:
+        The per-permit results and the saved bundle's name, path and size
+    """
+    bundle = form_filler.open_bundle("project")
+    entries = {}
+    
+    async def add(permit, result):
+        name = f"{permit['id']}-permit.docx"
+        if 'content' in result:
+            entries[permit['id']] = await asyncio.to_thread(bundle.add, name, result.pop('content'))
+            # Only the bundle holds this document
+            del result['outputFile'], result['size']
+        else:
+            entries[permit['id']] = await asyncio.to_thread(bundle.add_file, name, Path(result['outputPath']))
+        result['bundleEntry'] = name
+    
+    try:
+        results = await _fill_permits(permits, project_data, True, add)
+        listed = []
+        for permit, result in zip(permits, results):
+            entry = {
+                "permitId": permit['id'],
+                "permitName": permit['name'],
+                "valid": 'missingFields' not in result
+            }
+            if 'missingFields' in result:
+                entry["missingFields"] = result['missingFields']
+            if permit['id'] in entries:
+                entry.update(entries[permit['id']])
+            else:
+                entry["error"] = result.get('error')
+            listed.append(entry)
+        
+        manifest = {
+            "createdAt": datetime.now().isoformat(timespec='seconds'),
+            "projectDescription": project_description,
+            "permits": listed
+        }
+        await asyncio.to_thread(bundle.close, manifest)
+    except BaseException:
+        bundle.abort()
+        raise
+    
+    return results, {
+        "outputFile": bundle.path.name,
+        "outputPath": str(bundle.path.absolute()),
+        "size": bundle.path.stat().st_size,
+        "entries": len(entries)
+    }
+
+def _bulk_input_path(file_name):
+    """Resolve a projects file, refusing anything outside BULK_INPUT_DIR"""
+    path = (BULK_INPUT_DIR / file_name).resolve()
+    if BULK_INPUT_DIR.resolve() not in path.parents or not path.is_file():
+        raise ValueError(f"Projects file not found in the bulk input directory: {file_name}")
+    return path
+
+def _read_projects_file(path):
+    """Yield (line number, project) for each record of a JSON Lines file"""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"Invalid JSON on line {line_number}: {e.msg}")
+
+def _bulk_jobs(projects, matcher, counts):
+    """
+    Match each project's permits and yield one FormFiller.fill_many job per permit
+    
+    Projects are consumed lazily; counts tallies projects and those
+    requiring no permit.
+    """
+    for key, project in projects:
+        counts['projects'] += 1
+        if not isinstance(project, dict):
+            error = project if isinstance(project, Exception) else "Project must be an object"
+            yield {"project": key, "error": str(error)}
+            continue
+        
+        key = project.get("id", key)
+        try:
+            required_permits = matcher.identify_permits(
+                project.get("projectDescription", ""),
+                project.get("workTypes", [])
+            )
+        except Exception as e:
+            # A malformed record fails on its own, not the whole request
+            yield {"project": key, "error": str(e)}
+            continue
+        if not required_permits:
+            counts['withoutPermits'] += 1
+        
+        for permit in required_permits:
+            yield {
+                "project": key,
+                "template": permit['template'],
+                "permitId": permit['id'],
+                "permitName": permit['name'],
+                "requiredFields": permit['requiredFields'],
+                "projectData": project.get("projectData", {})
+            }
+
+def _packet_records(projects, required_fields):
+    """
+    Project data of each record of a permit packet, and the first
+    BULK_MAX_REPORTED_FAILURES records that cannot be filled
+    """
+    records, invalid = [], []
+    for key, project in projects:
+        if isinstance(project, dict):
+            key = project.get("id", key)
+            project_data = project.get("projectData", {})
+            validation = form_filler.validate_required_fields(project_data, required_fields)
+            if validation['valid']:
+                records.append(project_data)
+                continue
+            problem = {"project": key, "missingFields": validation['missingFields']}
+        else:
+            error = project if isinstance(project, Exception) else "Project must be an object"
+            problem = {"project": key, "error": str(error)}
+        if len(invalid) < BULK_MAX_REPORTED_FAILURES:
+            invalid.append(problem)
+    return records, invalid
+
+def _progress_reporter():
+    """
+    Callback streaming fill results as progress notifications, or None
+    when the client did not ask for progress
+    """
+    try:
+        context = server.request_context
+    except LookupError:
+        return None
+    progress_token = context.meta.progressToken if context.meta else None
+    if progress_token is None:
+        return None
+    
+    done = 0
+    
+    async def report(result):
+        nonlocal done
+        done += 1
+        await context.session.send_progress_notification(
+            progress_token,
+            done,
+            message=json.dumps(result, separators=(",", ":"))
+        )
+    
+    return report
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """List available tools"""
@@ -151,7 +478,62 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "array",
                         "items": {"type": "string"},
                         "description": "Array of work types (e.g., ['construction', 'electrical work'])"
-                    }
+                    },
+                    "explain": {
+                        "type": "boolean",
+                        "description": "Also return which triggers matched for each permit and their character offsets"
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
+                },
+                "required": ["projectDescription"]
+            }
+        ),
+        types.Tool(
+            name="identify_required_permits_batch",
+            description="Identifies the required permits for many project descriptions in one call",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "projectDescriptions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Descriptions of the projects to triage"
+                    },
+                    "workTypes": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional array of work types applied to every description"
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
+                },
+                "required": ["projectDescriptions"]
+            }
+        ),
+        types.Tool(
+            name="rank_permits",
+            description="Ranks permits by relevance to a free-text project description, for descriptions that do not use the exact trigger phrases",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "projectDescription": {
+                        "type": "string",
+                        "description": "Description of the project work to be done"
+                    },
+                    "workTypes": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional array of work types (e.g., ['construction', 'electrical work'])"
+                    },
+                    "threshold": {
+                        "type": "number",
+                        "description": "Minimum relevance score between 0 and 1 (default 0.1)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "Maximum number of permits to return (default 10)"
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
                 },
                 "required": ["projectDescription"]
             }
@@ -169,7 +551,8 @@ async def handle_list_tools() -> list[types.Tool]:
                     "projectData": {
                         "type": "object",
                         "description": "Project information to preview"
-                    }
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
                 },
                 "required": ["permitId", "projectData"]
             }
@@ -187,7 +570,8 @@ async def handle_list_tools() -> list[types.Tool]:
                     "projectData": {
                         "type": "object",
                         "description": "Complete project information"
-                    }
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
                 },
                 "required": ["projectDescription", "projectData"]
             }
@@ -244,7 +628,9 @@ async def handle_list_tools() -> list[types.Tool]:
                             "waterHeater": {"type": "string"},
                             "backflowPrevention": {"type": "string"}
                         }
-                    }
+                    },
+                    "returnDocument": RETURN_DOCUMENT_PROPERTY,
+                    "jurisdiction": JURISDICTION_PROPERTY
                 },
                 "required": ["permitId", "projectData"]
             }
@@ -267,17 +653,95 @@ async def handle_list_tools() -> list[types.Tool]:
                     "projectData": {
                         "type": "object",
                         "description": "Complete project information"
-                    }
+                    },
+                    "returnDocument": RETURN_DOCUMENT_PROPERTY,
+                    "bundle": {
+                        "type": "boolean",
+                        "description": "Save all filled permits in one project zip, with a JSON manifest of permit ids, checksums and validation status, instead of as separate files"
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
                 },
                 "required": ["projectDescription", "projectData"]
             }
         ),
+        types.Tool(
+            name="fill_permits_bulk",
+            description="Identifies and fills the required permits of many projects at once, reporting each filled permit as a progress notification and returning a compact summary",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "projects": {
+                        "type": "array",
+                        "description": "Projects to fill, each with projectDescription, projectData, optional workTypes and an optional id echoed in the results",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": ["string", "integer"]},
+                                "projectDescription": {"type": "string"},
+                                "workTypes": {"type": "array", "items": {"type": "string"}},
+                                "projectData": {"type": "object"}
+                            },
+                            "required": ["projectDescription", "projectData"]
+                        }
+                    },
+                    "projectsFile": {
+                        "type": "string",
+                        "description": "Alternatively, a JSON Lines file of such projects, relative to the server's bulk input directory"
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
+                }
+            }
+        ),
+        types.Tool(
+            name="fill_permit_packet",
+            description="Fills one permit for many projects into a single document, one application per page, for batch submissions",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "permitId": {
+                        "type": "string",
+                        "description": "ID of the permit to fill for every project"
+                    },
+                    "projects": {
+                        "type": "array",
+                        "description": "Projects in packet order, each with projectData and an optional id used to report invalid records",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": ["string", "integer"]},
+                                "projectData": {"type": "object"}
+                            },
+                            "required": ["projectData"]
+                        }
+                    },
+                    "projectsFile": {
+                        "type": "string",
+                        "description": "Alternatively, a JSON Lines file of such projects, relative to the server's bulk input directory"
+                    },
+                    "returnDocument": RETURN_DOCUMENT_PROPERTY,
+                    "jurisdiction": JURISDICTION_PROPERTY
+                },
+                "required": ["permitId"]
+            }
+        ),
         types.Tool(
             name="list_available_permits",
             description="Lists all available permit types",
             inputSchema={
                 "type": "object",
-                "properties": {}
+                "properties": {
+                    "jurisdiction": JURISDICTION_PROPERTY
+                }
+            }
+        ),
+        types.Tool(
+            name="get_matcher_stats",
+            description="Shows hit, miss and eviction counters of the permit identification cache, the state of the form renderer, the compiled template cache and output retention sweeps",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "jurisdiction": JURISDICTION_PROPERTY
+                }
             }
         ),
         types.Tool(
@@ -293,7 +757,8 @@ async def handle_list_tools() -> list[types.Tool]:
                     "projectData": {
                         "type": "object",
                         "description": "Project data to validate"
-                    }
+                    },
+                    "jurisdiction": JURISDICTION_PROPERTY
                 },
                 "required": ["permitId", "projectData"]
             }
@@ -307,14 +772,28 @@ async def handle_call_tool(
 ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
     """Handle tool execution requests"""
     
+    matcher = None
+    pinned_rules = None
+    
     try:
+        # Route to the permit catalog of the requested jurisdiction; only a
+        # cold shard goes to a worker thread, to be compiled off the event loop
+        jurisdiction = (arguments or {}).get("jurisdiction")
+        matcher = permit_router.resident(jurisdiction)
+        if matcher is None:
+            matcher = await asyncio.to_thread(permit_router.get, jurisdiction)
+        
+        # Keep the same rules for the whole call even if they are reloaded meanwhile
+        pinned_rules = matcher.pin()
+        
         if name == "identify_required_permits":
             project_description = arguments.get("projectDescription", "")
             work_types = arguments.get("workTypes", [])
             
-            required_permits = permit_matcher.identify_permits(
+            required_permits = matcher.identify_permits(
                 project_description, 
-                work_types
+                work_types,
+                explain=bool(arguments.get("explain", False))
             )
             
             result = {
@@ -330,12 +809,52 @@ async def handle_call_tool(
                 text=json.dumps(result, indent=2)
             )]
         
+        elif name == "identify_required_permits_batch":
+            project_descriptions = arguments.get("projectDescriptions", [])
+            work_types = arguments.get("workTypes", [])
+            
+            matrix = matcher.identify_permits_many(
+                project_descriptions,
+                work_types
+            )
+            
+            # Compact output: one list of permit IDs per description
+            result = {
+                "requiredPermits": [
+                    matrix.permit_ids(row) for row in range(len(matrix))
+                ],
+                "count": len(matrix)
+            }
+            
+            return [types.TextContent(
+                type="text",
+                text=json.dumps(result, separators=(",", ":"))
+            )]
+        
+        elif name == "rank_permits":
+            project_description = arguments.get("projectDescription", "")
+            
+            ranked_permits = matcher.rank_permits(
+                project_description,
+                arguments.get("workTypes", []),
+                threshold=arguments.get("threshold"),
+                limit=arguments.get("limit")
+            )
+            
+            return [types.TextContent(
+                type="text",
+                text=json.dumps({
+                    "rankedPermits": ranked_permits,
+                    "count": len(ranked_permits)
+                }, indent=2)
+            )]
+        
         elif name == "preview_permit":
             permit_id = arguments.get("permitId")
             project_data = arguments.get("projectData", {})
             
             # Get permit details
-            permit = permit_matcher.get_permit_by_id(permit_id)
+            permit = matcher.get_permit_by_id(permit_id)
             if not permit:
                 raise ValueError(f"Permit not found: {permit_id}")
             
@@ -407,7 +926,7 @@ async def handle_call_tool(
             project_data = arguments.get("projectData", {})
             
             # Identify required permits
-            required_permits = permit_matcher.identify_permits(project_description)
+            required_permits = matcher.identify_permits(project_description)
             
             if not required_permits:
                 return [types.TextContent(
@@ -424,9 +943,8 @@ async def handle_call_tool(
             preview_lines.append(f"Total Permits Required: {len(required_permits)}")
             preview_lines.append("")
             
-            for i, permit_info in enumerate(required_permits, 1):
-                permit = permit_matcher.get_permit_by_id(permit_info['id'])
-                
+            # Matched permits already carry name and required fields
+            for i, permit in enumerate(required_permits, 1):
                 preview_lines.append(f"\n{'#' * 70}")
                 preview_lines.append(f"PERMIT {i}: {permit['name']}")
                 preview_lines.append(f"{'#' * 70}\n")
@@ -472,7 +990,7 @@ async def handle_call_tool(
             project_data = arguments.get("projectData", {})
             
             # Get permit details
-            permit = permit_matcher.get_permit_by_id(permit_id)
+            permit = matcher.get_permit_by_id(permit_id)
             if not permit:
                 raise ValueError(f"Permit not found: {permit_id}")
             
@@ -494,17 +1012,19 @@ async def handle_call_tool(
                 )]
             
             # Fill the form
-            result = form_filler.fill_permit(
+            result = await form_filler.fill_permit_async(
                 permit['template'],
                 permit['id'],
                 permit['name'],
-                project_data
+                project_data,
+                arguments.get("returnDocument", False)
             )
+            documents = [_document_resource(result)] if 'content' in result else []
             
             return [types.TextContent(
                 type="text",
                 text=json.dumps(result, indent=2)
-            )]
+            )] + documents
         
         elif name == "fill_all_required_permits":
             project_description = arguments.get("projectDescription", "")
@@ -512,7 +1032,7 @@ async def handle_call_tool(
             project_data = arguments.get("projectData", {})
             
             # Identify required permits
-            required_permits = permit_matcher.identify_permits(
+            required_permits = matcher.identify_permits(
                 project_description, 
                 work_types
             )
@@ -523,43 +1043,26 @@ async def handle_call_tool(
                     text="No permits required for this project"
                 )]
             
-            # Fill all required permits
-            results = []
-            for permit_info in required_permits:
-                try:
-                    permit = permit_matcher.get_permit_by_id(permit_info['id'])
-                    
-                    # Validate fields
-                    validation = form_filler.validate_required_fields(
-                        project_data,
-                        permit['requiredFields']
-                    )
-                    
-                    if not validation['valid']:
-                        results.append({
-                            "success": False,
-                            "permitId": permit['id'],
-                            "permitName": permit['name'],
-                            "error": "Missing required fields",
-                            "missingFields": validation['missingFields']
-                        })
-                        continue
-                    
-                    # Fill permit
-                    result = form_filler.fill_permit(
-                        permit['template'],
-                        permit['id'],
-                        permit['name'],
-                        project_data
-                    )
-                    results.append(result)
-                    
-                except Exception as e:
-                    results.append({
-                        "success": False,
-                        "permitId": permit_info['id'],
-                        "error": str(e)
-                    })
+            if arguments.get("bundle", False):
+                results, bundle = await _fill_bundle(required_permits, project_data, project_description)
+                
+                return [types.TextContent(
+                    type="text",
+                    text=json.dumps({
+                        "totalPermits": len(results),
+                        "results": results,
+                        "bundle": bundle,
+                        "message": "All required permits have been processed into one bundle"
+                    }, indent=2)
+                )]
+            
+            # Fill all required permits concurrently, in their original order
+            results = await _fill_permits(
+                required_permits,
+                project_data,
+                arguments.get("returnDocument", False)
+            )
+            documents = [_document_resource(result) for result in results if 'content' in result]
             
             return [types.TextContent(
                 type="text",
@@ -568,16 +1071,89 @@ async def handle_call_tool(
                     "results": results,
                     "message": "All required permits have been processed"
                 }, indent=2)
+            )] + documents
+        
+        elif name == "fill_permits_bulk":
+            if "projectsFile" in arguments:
+                projects = _read_projects_file(_bulk_input_path(arguments["projectsFile"]))
+            else:
+                projects = enumerate(arguments.get("projects", []))
+            
+            counts = {"projects": 0, "withoutPermits": 0}
+            summary = await form_filler.fill_many(
+                _bulk_jobs(projects, matcher, counts),
+                BULK_FILL_CONCURRENCY,
+                _progress_reporter(),
+                BULK_MAX_REPORTED_FAILURES
+            )
+            
+            return [types.TextContent(
+                type="text",
+                text=json.dumps({**counts, **summary}, separators=(",", ":"))
             )]
         
+        elif name == "fill_permit_packet":
+            permit_id = arguments.get("permitId")
+            
+            permit = matcher.get_permit_by_id(permit_id)
+            if not permit:
+                raise ValueError(f"Permit not found: {permit_id}")
+            
+            if "projectsFile" in arguments:
+                projects = _read_projects_file(_bulk_input_path(arguments["projectsFile"]))
+            else:
+                projects = enumerate(arguments.get("projects", []))
+            
+            # A packet is submitted whole, so one invalid record fails it
+            records, invalid = await asyncio.to_thread(_packet_records, projects, permit['requiredFields'])
+            if invalid or not records:
+                return [types.TextContent(
+                    type="text",
+                    text=json.dumps({
+                        "success": False,
+                        "permitName": permit['name'],
+                        "error": "Invalid records" if invalid else "No records",
+                        "invalidRecords": invalid
+                    }, indent=2)
+                )]
+            
+            result = await form_filler.fill_packet_async(
+                permit['template'],
+                permit['id'],
+                permit['name'],
+                records,
+                arguments.get("returnDocument", False)
+            )
+            documents = [_document_resource(result)] if 'content' in result else []
+            
+            return [types.TextContent(
+                type="text",
+                text=json.dumps(result, indent=2)
+            )] + documents
+        
         elif name == "list_available_permits":
-            permits = permit_matcher.list_all_permits()
+            permits = matcher.list_all_permits()
             
             return [types.TextContent(
                 type="text",
                 text=json.dumps({
                     "permits": permits,
-                    "count": len(permits)
+                    "count": len(permits),
+                    "jurisdictions": permit_router.list_jurisdictions()
+                }, indent=2)
+            )]
+        
+        elif name == "get_matcher_stats":
+            return [types.TextContent(
+                type="text",
+                text=json.dumps({
+                    "cache": matcher.cache_info(),
+                    "permits": len(matcher.ruleset),
+                    "engine": matcher.engine,
+                    "jurisdictions": permit_router.info(),
+                    "renderer": form_filler.executor_info(),
+                    "templates": form_filler.templates.info(),
+                    "outputs": output_sweeper.info()
                 }, indent=2)
             )]
         
@@ -585,7 +1161,7 @@ async def handle_call_tool(
             permit_id = arguments.get("permitId")
             project_data = arguments.get("projectData", {})
             
-            permit = permit_matcher.get_permit_by_id(permit_id)
+            permit = matcher.get_permit_by_id(permit_id)
             if not permit:
                 raise ValueError(f"Permit not found: {permit_id}")
             
@@ -593,16 +1169,29 @@ async def handle_call_tool(
                 project_data,
                 permit['requiredFields']
             )
+            result = {
+                "permitId": permit_id,
+                "permitName": permit['name'],
+                "valid": validation['valid'],
+                "missingFields": validation['missingFields'],
+                "requiredFields": permit['requiredFields']
+            }
+            # Fields the template renders that may be left out (and come out
+            # blank); compiling a cold template stays off the event loop
+            try:
+                variables = await asyncio.to_thread(form_filler.template_variables, permit['template'])
+            except FileNotFoundError:
+                logger.warning(f"Template not found for permit {permit_id}: {permit['template']}")
+            except Exception as e:
+                logger.warning(f"Unreadable template for permit {permit_id}: {permit['template']}: {e}")
+            else:
+                result["optionalFields"] = sorted(
+                    variables - set(permit['requiredFields']) - set(AUTO_FILLED_FIELDS)
+                )
             
             return [types.TextContent(
                 type="text",
-                text=json.dumps({
-                    "permitId": permit_id,
-                    "permitName": permit['name'],
-                    "valid": validation['valid'],
-                    "missingFields": validation['missingFields'],
-                    "requiredFields": permit['requiredFields']
-                }, indent=2)
+                text=json.dumps(result, indent=2)
             )]
         
         else:
@@ -613,6 +1202,10 @@ async def handle_call_tool(
             type="text",
             text=f"Error: {str(e)}"
         )]
+    
+    finally:
+        if pinned_rules is not None:
+            matcher.unpin(pinned_rules)
 
 async def main():
     """Main entry point for the server"""
@@ -636,6 +1229,8 @@ async def main():
         logger.error(f"Server error: {e}")
         logger.error(traceback.format_exc())
         raise
+    finally:
+        form_filler.shutdown(wait=False)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,518 @@
+import copy
+import hashlib
+import io
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.parts.styles import StylesPart
+from docxtpl import DocxTemplate
+from jinja2 import Environment, Template, meta, nodes
+
+from docx_archive import RawMember, TemplateArchive, write_archive
+
+logger = logging.getLogger(__name__)
+
+# Core properties docxtpl renders as templates
+RENDERED_PROPERTIES = ('author', 'comments', 'identifier', 'language', 'subject', 'title')
+
+FOOTNOTES_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml'
+
+# Paragraph separating the records of a packet (as docxtpl renders '\f')
+PAGE_BREAK_XML = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+# Values the splice renderer writes as Jinja would; others go through docxtpl
+_SPLICE_TYPES = (str, int, float, bool, type(None))
+# What docxtpl would alter in a value rendered without autoescaping: markup
+# it drops, characters XML cannot hold, listing characters it expands and
+# the escaped braces it restores
+_UNSPLICEABLE = re.compile(r'[\x00-\x1f&<\ud800-\udfff\ufffe\uffff]|\]\]>|\{_[{%]|[}%]_\}')
+# Placeholder values marking where each variable lands in the rendered body
+_MARKER = re.compile(r'\ue000([0-9]+)\ue001')
+
+_BODY_START = re.compile(r'<w:body[^>]*>')
+# The body's own section properties: the last sectPr, not inside a paragraph
+_BODY_END = re.compile(r'(<w:sectPr[ >](?:(?!</w:p>|<w:sectPr[ >]).)*)?</w:body>', re.DOTALL)
+
+
+class _TemplateEnvironment(Environment):
+    """
+    Jinja environment that compiles each distinct source only once
+
+    docxtpl compiles the body, headers, footers, footnotes and core
+    properties of a template on every render. Their sources are identical
+    from one render of the same template to the next, so the compiled
+    templates are kept and reused.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._compiled: Dict[str, Template] = {}
+        self._compile_lock = threading.Lock()
+
+    def from_string(self, source, globals=None, template_class=None) -> Template:
+        if globals is not None or template_class is not None:
+            return super().from_string(source, globals, template_class)
+
+        template = self._compiled.get(source)
+        if template is None:
+            with self._compile_lock:
+                template = self._compiled.get(source)
+                if template is None:
+                    template = super().from_string(source)
+                    self._compiled[source] = template
+        return template
+
+
+class _PreparedDocxTemplate(DocxTemplate):
+    """DocxTemplate that renders from a compiled template instead of the file"""
+
+    def __init__(self, compiled: 'CompiledTemplate'):
+        super().__init__(io.BytesIO(compiled.source))
+        self._compiled = compiled
+
+    def init_docx(self, reload: bool = True):
+        if not self.docx or (self.is_rendered and reload):
+            self.docx = self._compiled.clone_document()
+            self.is_rendered = False
+
+    def build_xml(self, context, jinja_env=None):
+        # The body is serialized and patched once per template, not per render
+        return self.render_xml_part(self._compiled.body_xml, self.docx._part, context, jinja_env)
+
+    def render(
+        self,
+        context: Dict[str, Any],
+        jinja_env: Optional[Environment] = None,
+        autoescape: bool = False
+    ) -> None:
+        if jinja_env is None and not autoescape:
+            jinja_env = self._compiled.environment
+        super().render(context, jinja_env, autoescape)
+
+    def save(self, filename: Union[str, BinaryIO], *args, **kwargs) -> None:
+        replacing = (
+            self.pics_to_replace or self.crc_to_new_media
+            or self.crc_to_new_embedded or self.zipname_to_replace
+        )
+        if self.is_rendered and not replacing and self._compiled.write(self.docx, filename):
+            self.is_saved = True
+        else:
+            super().save(filename, *args, **kwargs)
+
+
+class _PacketDocxTemplate(_PreparedDocxTemplate):
+    """DocxTemplate that renders the body once per record into one document"""
+
+    def __init__(self, compiled: 'CompiledTemplate', records: List[Dict[str, Any]]):
+        super().__init__(compiled)
+        self._records = records
+
+    def build_xml(self, context, jinja_env=None):
+        head, record, tail = self._compiled.body_parts
+        pages = [
+            self.render_xml_part(record, self.docx._part, record_context, jinja_env)
+            for record_context in self._records
+        ]
+        return head + PAGE_BREAK_XML.join(pages) + tail
+
+
+def _only_placeholders(tree: nodes.Template) -> bool:
+    """Whether a parsed template is nothing but text and {{ variable }} outputs"""
+    return all(
+        isinstance(node, nodes.Output)
+        and all(isinstance(child, (nodes.TemplateData, nodes.Name)) for child in node.nodes)
+        for node in tree.body
+    )
+
+
+class _SplicedText:
+    """
+    Rendered XML split at the placeholder markers into byte chunks, ready
+    to be joined with the escaped values of a context
+    """
+
+    def __init__(self, text: str, names: Sequence[str]):
+        pieces = _MARKER.split(text)
+        self.chunks = [piece.encode('utf-8') for piece in pieces[0::2]]
+        self.slots = [names[int(index)] for index in pieces[1::2]]
+
+        # Runs of placeholders that make up an element's whole text: left
+        # empty, the element would be serialized as <w:t/>
+        self.whole_texts = []
+        run = []
+        for slot in range(len(self.slots)):
+            run.append(slot)
+            if self.chunks[slot + 1]:
+                if self.chunks[run[0]].endswith(b'>') and self.chunks[slot + 1].startswith(b'<'):
+                    self.whole_texts.append(run)
+                run = []
+
+    def render(self, context: Dict[str, Any]) -> Optional[bytes]:
+        """The text filled with the context, or None if a value needs docxtpl"""
+        texts = {}
+        for name in set(self.slots):
+            if name not in context:
+                # Undefined, which Jinja renders empty
+                texts[name] = b''
+                continue
+            value = context[name]
+            if type(value) not in _SPLICE_TYPES:
+                return None
+            text = str(value)
+            if _UNSPLICEABLE.search(text):
+                return None
+            texts[name] = escape(text).encode('utf-8')
+
+        for run in self.whole_texts:
+            if not any(texts[self.slots[slot]] for slot in run):
+                return None
+
+        parts = [self.chunks[0]]
+        for name, chunk in zip(self.slots, self.chunks[1:]):
+            parts += (texts[name], chunk)
+        return b''.join(parts)
+
+
+class _SpliceRenderer:
+    """
+    Renders a template whose only markup is {{ variable }} placeholders
+    without docxtpl
+
+    The template is rendered once through docxtpl with a marker for each
+    variable. The rendered body is then split at the markers into byte
+    chunks, and every other member is kept as written. A render joins the
+    chunks with the XML-escaped values and deflates the body again. The
+    result is identical to docxtpl's, member for member. Values docxtpl
+    would alter fall back to it, as do empty values that would empty an
+    element.
+
+    Packets are spliced the same way, one copy of the body's content per
+    record, when every placeholder lies inside that content.
+    """
+
+    def __init__(self, compiled: 'CompiledTemplate', names: Sequence[str], members: List[RawMember]):
+        self.document_name = compiled._document.part.partname.membername
+        self.members = members
+        self.document_index = [member.name for member in members].index(self.document_name)
+
+        text = members[self.document_index].read().decode('utf-8')
+        self.document = _SplicedText(text, names)
+
+        # The document as the text up to the body's content, the content
+        # and the text from its section properties on
+        self.packet = None
+        body_start = _BODY_START.search(text)
+        body_end = body_start and _BODY_END.search(text, body_start.end())
+        if body_end:
+            head, tail = text[:body_start.end()], text[body_end.start():]
+            if not _MARKER.search(head) and not _MARKER.search(tail):
+                self.packet = (
+                    head.encode('utf-8'),
+                    _SplicedText(text[body_start.end():body_end.start()], names),
+                    tail.encode('utf-8')
+                )
+
+    @classmethod
+    def prepare(cls, compiled: 'CompiledTemplate') -> Optional['_SpliceRenderer']:
+        """Renderer for a compiled template, or None if its output cannot be spliced"""
+        if _MARKER.search(compiled.body_xml):
+            return None
+        names = sorted(compiled.variables)
+        markers = {name: f'\ue000{index}\ue001' for index, name in enumerate(names)}
+        members = list(TemplateArchive(compiled.render_docxtpl(markers)).members.values())
+        if any(
+            _MARKER.search(member.read().decode('utf-8', 'replace'))
+            for member in members if member.name != compiled._document.part.partname.membername
+        ):
+            return None
+        renderer = cls(compiled, names, members)
+
+        # Check the escaping against docxtpl itself
+        probe = {name: f'{name} > "{index}" \'\u00fc\'' for index, name in enumerate(names)}
+        if not _same_members(compiled.render_docxtpl(probe), renderer.render(probe)):
+            logger.warning(f"Template {compiled.path.name} does not splice like docxtpl renders it")
+            return None
+
+        # And the pages of a packet against docxtpl's packet
+        if renderer.packet is not None:
+            records = [probe, {name: f'{value} 2' for name, value in probe.items()}]
+            if not _same_members(compiled.render_packet_docxtpl(records, {}), renderer.render_packet(records)):
+                logger.warning(f"Template {compiled.path.name} does not splice packets like docxtpl renders them")
+                renderer.packet = None
+        return renderer
+
+    def _archive(self, document: bytes) -> bytes:
+        """The template's members with the given document body"""
+        members = list(self.members)
+        members[self.document_index] = RawMember.deflate(self.document_name, document)
+        output = io.BytesIO()
+        write_archive(members, output)
+        return output.getvalue()
+
+    def render(self, context: Dict[str, Any]) -> Optional[bytes]:
+        """The filled document, or None if a value needs docxtpl"""
+        document = self.document.render(context)
+        if document is None:
+            return None
+        return self._archive(document)
+
+    def render_packet(self, records: List[Dict[str, Any]]) -> Optional[bytes]:
+        """The filled packet, or None if it or a value needs docxtpl"""
+        if self.packet is None:
+            return None
+        head, record, tail = self.packet
+        pages = []
+        for context in records:
+            page = record.render(context)
+            if page is None:
+                return None
+            pages.append(page)
+        return self._archive(head + PAGE_BREAK_XML.encode('utf-8').join(pages) + tail)
+
+
+def _same_members(expected: bytes, actual: Optional[bytes]) -> bool:
+    """Whether two documents have the same members with the same content"""
+    if actual is None:
+        return False
+    expected_members = TemplateArchive(expected).members
+    actual_members = TemplateArchive(actual).members
+    return list(actual_members) == list(expected_members) and all(
+        actual_members[name].read() == member.read() for name, member in expected_members.items()
+    )
+
+
+class CompiledTemplate:
+    """
+    A docx template parsed once and rendered many times
+
+    Holds the template's bytes, its parsed document (never rendered itself,
+    only cloned) and its patched body XML; the compiled Jinja templates
+    accumulate in its environment as they are first rendered. The names of
+    the variables the template reads are indexed once, from every part
+    docxtpl renders.
+
+    Clones share the style definitions with the parsed document: they are
+    by far its largest tree and rendering only reads them.
+
+    A rendered clone is written by copying every zip member whose content
+    did not change straight from the template archive, still compressed;
+    only the re-rendered parts are serialized and deflated.
+
+    Templates with nothing but {{ variable }} placeholders are rendered by
+    splicing the values into the rendered body instead (see
+    _SpliceRenderer); render() falls back to docxtpl for the rest.
+    """
+
+    def __init__(self, path: Path, fingerprint: Tuple[int, int], source: bytes):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.source = source
+        # Identifies the template's content, whatever its file's timestamps
+        self.digest = hashlib.sha256(source).hexdigest()
+        self.environment = _TemplateEnvironment()
+
+        self._document = Document(io.BytesIO(source))
+        parser = DocxTemplate(io.BytesIO(source))
+        parser.docx = self._document
+        self.body_xml = parser.patch_xml(parser.get_xml())
+        trees = [self.environment.parse(source) for source in self._jinja_sources(parser)]
+        self.variables = frozenset().union(*map(meta.find_undeclared_variables, trees))
+        self.body_parts = self._split_body(self.body_xml)
+
+        package = self._document.part.package
+        self._shared = [
+            part._element for part in package.iter_parts()
+            if isinstance(part, StylesPart)
+        ]
+
+        self.archive = TemplateArchive(source)
+        # What python-docx would write for each unrendered member
+        self._content_types = self._part_types(package)
+        self._blobs = {PACKAGE_URI.rels_uri.membername: package.rels.xml}
+        for part in package.iter_parts():
+            if getattr(part, '_element', None) not in self._shared:
+                self._blobs[part.partname.membername] = part.blob
+            if len(part.rels):
+                self._blobs[part.partname.rels_uri.membername] = part.rels.xml
+
+        self._splice = _SpliceRenderer.prepare(self) if all(map(_only_placeholders, trees)) else None
+
+    def _jinja_sources(self, parser: DocxTemplate) -> List[str]:
+        """Jinja sources of the body, headers, footers, footnotes and properties"""
+        sources = [self.body_xml]
+        for uri in (parser.HEADER_URI, parser.FOOTER_URI):
+            sources += [
+                parser.patch_xml(parser.get_part_xml(part))
+                for _, part in parser.get_headers_footers(uri)
+            ]
+        for part in self._document.part.package.iter_parts():
+            if part.content_type == FOOTNOTES_CONTENT_TYPE:
+                sources.append(parser.patch_xml(part.blob.decode('utf-8')))
+        sources += [getattr(self._document.core_properties, name) or '' for name in RENDERED_PROPERTIES]
+        return sources
+
+    @staticmethod
+    def _split_body(xml: str) -> Tuple[str, str, str]:
+        """
+        The body XML as the text up to the body's content, the content
+        itself and the text from its section properties on
+        """
+        start = _BODY_START.search(xml).end()
+        end = _BODY_END.search(xml, start).start()
+        return xml[:start], xml[start:end], xml[end:]
+
+    def clone_document(self):
+        """Copy of the parsed document, ready to be rendered"""
+        return copy.deepcopy(self._document, {id(element): element for element in self._shared})
+
+    @staticmethod
+    def _part_types(package) -> list:
+        return [(part.partname, part.content_type) for part in package.iter_parts()]
+
+    def _member(self, name: str, content: bytes) -> RawMember:
+        """Template member if the content is unchanged, else a new one"""
+        if name in self.archive.members and content == self._blobs.get(name):
+            return self.archive.members[name]
+        return RawMember.deflate(name, content)
+
+    def write(self, document, output: Union[str, BinaryIO]) -> bool:
+        """
+        Write a rendered clone, reusing the template's unchanged members
+
+        Returns:
+            False, without writing anything, if rendering added or removed
+            parts; the caller must then save the document the regular way
+        """
+        package = document.part.package
+        if self._part_types(package) != self._content_types:
+            return False
+
+        members = [
+            self.archive.members[CONTENT_TYPES_URI.membername],
+            self._member(PACKAGE_URI.rels_uri.membername, package.rels.xml)
+        ]
+        for part in package.iter_parts():
+            name = part.partname.membername
+            if getattr(part, '_element', None) in self._shared and name in self.archive.members:
+                members.append(self.archive.members[name])
+            else:
+                members.append(self._member(name, part.blob))
+            if len(part.rels):
+                members.append(self._member(part.partname.rels_uri.membername, part.rels.xml))
+
+        write_archive(members, output)
+        return True
+
+    def new_document(self) -> DocxTemplate:
+        """Fresh DocxTemplate to render and save once"""
+        return _PreparedDocxTemplate(self)
+
+    def render_docxtpl(self, context: Dict[str, Any]) -> bytes:
+        """The filled document, rendered by docxtpl"""
+        document = self.new_document()
+        document.render(context)
+        output = io.BytesIO()
+        document.save(output)
+        return output.getvalue()
+
+    def render(self, context: Dict[str, Any]) -> bytes:
+        """The filled document, spliced when the template and values allow it"""
+        if self._splice is not None:
+            content = self._splice.render(context)
+            if content is not None:
+                return content
+        return self.render_docxtpl(context)
+
+    @property
+    def spliced(self) -> bool:
+        """Whether render() can splice values instead of running docxtpl"""
+        return self._splice is not None
+
+    def new_packet(self, records: List[Dict[str, Any]]) -> DocxTemplate:
+        """
+        Fresh DocxTemplate whose body is rendered once per record, the
+        records separated by page breaks
+
+        The document is parsed, its tables fixed and its headers, footers,
+        footnotes and properties rendered once, with the context passed to
+        render; only the body sees each record.
+        """
+        return _PacketDocxTemplate(self, records)
+
+    def render_packet_docxtpl(self, records: List[Dict[str, Any]], shared: Dict[str, Any]) -> bytes:
+        """
+        The filled packet, rendered by docxtpl
+
+        Args:
+            records: Context of each record's page, in order
+            shared: Context of the headers, footers and properties
+        """
+        document = self.new_packet(records)
+        document.render(shared)
+        output = io.BytesIO()
+        document.save(output)
+        return output.getvalue()
+
+    def render_packet(self, records: List[Dict[str, Any]], shared: Dict[str, Any]) -> bytes:
+        """The filled packet, spliced when the template and values allow it"""
+        if self._splice is not None:
+            content = self._splice.render_packet(records)
+            if content is not None:
+                return content
+        return self.render_packet_docxtpl(records, shared)
+
+
+class TemplateCache:
+    """
+    Thread-safe cache of compiled templates keyed by path
+
+    Each lookup stats the template file and recompiles it when its
+    modification time or size changed, so edited templates are picked up
+    without restarting the server.
+    """
+
+    def __init__(self):
+        self._templates: Dict[Path, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: Path) -> CompiledTemplate:
+        """
+        Get the compiled template for a file
+
+        Raises:
+            FileNotFoundError: If the template does not exist
+        """
+        stat = path.stat()
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            compiled = self._templates.get(path)
+            if compiled is not None and compiled.fingerprint == fingerprint:
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        # Compile outside the lock; concurrent misses at worst compile twice
+        compiled = CompiledTemplate(path, fingerprint, path.read_bytes())
+        logger.info(f"Compiled template {path.name}")
+
+        with self._lock:
+            self._templates[path] = compiled
+        return compiled
+
+    def info(self) -> Dict[str, int]:
+        """Hit/miss counters and number of compiled templates"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._templates)
+            }
@@ -0,0 +1,237 @@
+"""
+Offline compaction of permit templates
+
+Word pads every document it saves with parts that filling never needs: a
+style sheet holding every built-in style, a second copy of it with Word
+2010 effects, and a preview thumbnail. Compaction drops the redundant parts
+and every style nothing in the template refers to, checks that the result
+renders exactly the same parts, and writes it over the original (or to
+another directory).
+
+Usage:
+    python src/template_compactor.py [-o OUTPUT_DIR] [template.docx | templates_dir ...]
+"""
+import argparse
+import io
+import logging
+import shutil
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.parts.styles import StylesPart
+from lxml import etree
+
+from output_store import write_atomically
+from template_cache import CompiledTemplate
+
+logger = logging.getLogger(__name__)
+
+# Relationships whose targets only Word itself reads
+REDUNDANT_RELTYPES = (
+    'http://schemas.microsoft.com/office/2007/relationships/stylesWithEffects',
+    RT.THUMBNAIL,
+)
+
+# Elements whose w:val names a style
+_STYLE_REFERENCES = ('pStyle', 'rStyle', 'tblStyle', 'numStyleLink', 'styleLink')
+# Style properties naming another style the style depends on
+_STYLE_LINKS = ('basedOn', 'next', 'link')
+
+_W_NAMESPACE = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+_REFERENCE_XPATH = ' | '.join(f'//w:{name}/@w:val' for name in _STYLE_REFERENCES)
+
+# Members expected to differ between an original and a compacted rendering
+_PACKAGING_MEMBERS = (
+    '[Content_Types].xml',
+    '_rels/.rels',
+    'word/_rels/document.xml.rels',
+    'word/styles.xml',
+)
+
+
+def _drop_rels(part, reltypes: Iterable[str]) -> List[str]:
+    """Remove a part's (or the package's) relationships of the given types"""
+    dropped = []
+    for rId, rel in list(part.rels.items()):
+        if rel.reltype in reltypes:
+            del part.rels[rId]
+            part.rels.related_parts.pop(rId, None)
+            dropped.append(rel.target_ref)
+    return dropped
+
+
+def _referenced_styles(package) -> Set[str]:
+    """Style ids referred to by any XML part other than the style sheets"""
+    referenced = set()
+    for part in package.iter_parts():
+        if isinstance(part, StylesPart) or not part.content_type.endswith('xml'):
+            continue
+        tree = etree.fromstring(part.blob)
+        referenced.update(tree.xpath(_REFERENCE_XPATH, namespaces=_W_NAMESPACE))
+    return referenced
+
+
+def prune_styles(styles_element, referenced: Iterable[str]) -> int:
+    """
+    Remove the styles that are neither referenced, a default, nor depended on
+
+    Args:
+        styles_element: The w:styles element of the style sheet
+        referenced: Style ids the document refers to
+
+    Returns:
+        Number of styles removed
+    """
+    styles: Dict[str, etree._Element] = {
+        style.get(qn('w:styleId')): style for style in styles_element.iterfind(qn('w:style'))
+    }
+    keep = {
+        style_id for style_id, style in styles.items()
+        if style.get(qn('w:default')) in ('1', 'true', 'on')
+    }
+    pending = list(keep | set(referenced))
+    while pending:
+        style = styles.get(pending.pop())
+        if style is None:
+            continue
+        for name in _STYLE_LINKS:
+            link = style.find(qn(f'w:{name}'))
+            style_id = link.get(qn('w:val')) if link is not None else None
+            if style_id is not None and style_id not in keep:
+                keep.add(style_id)
+                pending.append(style_id)
+        keep.add(style.get(qn('w:styleId')))
+
+    removed = 0
+    for style_id, style in styles.items():
+        if style_id not in keep:
+            styles_element.remove(style)
+            removed += 1
+    return removed
+
+
+def compact_template(source: bytes) -> bytes:
+    """
+    Compact a .docx template
+
+    Args:
+        source: The template's bytes
+
+    Returns:
+        The compacted template's bytes
+    """
+    document = Document(io.BytesIO(source))
+    package = document.part.package
+
+    dropped = _drop_rels(package, REDUNDANT_RELTYPES) + _drop_rels(document.part, REDUNDANT_RELTYPES)
+    removed = prune_styles(document.styles.element, _referenced_styles(package))
+    logger.info(f"Dropped {', '.join(dropped) or 'no parts'} and {removed} unused styles")
+
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def _render(source: bytes) -> Dict[str, bytes]:
+    """Members of the template rendered with every variable set to its own name"""
+    compiled = CompiledTemplate(Path('template.docx'), (0, 0), source)
+    document = compiled.new_document()
+    document.render({name: f'{name} value' for name in compiled.variables})
+    output = io.BytesIO()
+    document.save(output)
+    with zipfile.ZipFile(output) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def verify_compaction(original: bytes, compacted: bytes) -> None:
+    """
+    Check that a compacted template renders the same as the original
+
+    Every rendered part must be byte-identical, except for the packaging
+    and the style sheet, which must still define each style the rendering
+    refers to.
+
+    Raises:
+        ValueError: If the renderings differ
+    """
+    expected = _render(original)
+    actual = _render(compacted)
+
+    with zipfile.ZipFile(io.BytesIO(original)) as before, zipfile.ZipFile(io.BytesIO(compacted)) as after:
+        dropped = set(before.namelist()) - set(after.namelist())
+    for name, content in expected.items():
+        if name in _PACKAGING_MEMBERS or (name in dropped and name not in actual):
+            continue
+        if actual.get(name) != content:
+            raise ValueError(f"Compacted template renders {name} differently")
+    extra = set(actual) - set(expected)
+    if extra:
+        raise ValueError(f"Compacted template renders extra parts: {', '.join(sorted(extra))}")
+
+    styles = etree.fromstring(actual['word/styles.xml'])
+    defined = set(styles.xpath('w:style/@w:styleId', namespaces=_W_NAMESPACE))
+    referenced = set()
+    for name, content in actual.items():
+        if name.endswith('.xml') and name != 'word/styles.xml':
+            referenced.update(etree.fromstring(content).xpath(_REFERENCE_XPATH, namespaces=_W_NAMESPACE))
+    missing = referenced - defined
+    if missing:
+        raise ValueError(f"Compacted template lost styles: {', '.join(sorted(missing))}")
+
+
+def _template_paths(paths: Iterable[str]) -> List[Path]:
+    templates = []
+    for path in map(Path, paths):
+        templates += sorted(path.glob('*.docx')) if path.is_dir() else [path]
+    return templates
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compact .docx permit templates")
+    parser.add_argument(
+        'templates', nargs='*',
+        default=[str(Path(__file__).parent.parent / 'templates')],
+        help="template files or directories (default: the templates directory)"
+    )
+    parser.add_argument(
+        '-o', '--output-dir',
+        help="write compacted templates here instead of over the originals"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    failed = 0
+    for path in _template_paths(args.templates):
+        original = path.read_bytes()
+        started = time.perf_counter()
+        compacted = compact_template(original)
+        try:
+            verify_compaction(original, compacted)
+        except ValueError as e:
+            print(f"{path.name}: not compacted: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        target = Path(args.output_dir) / path.name if args.output_dir else path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_atomically(target, compacted)
+        shutil.copymode(path, target)
+
+        with zipfile.ZipFile(io.BytesIO(original)) as before, zipfile.ZipFile(io.BytesIO(compacted)) as after:
+            unzipped = (sum(i.file_size for i in before.infolist()), sum(i.file_size for i in after.infolist()))
+        print(
+            f"{path.name}: {len(original):,} -> {len(compacted):,} bytes "
+            f"({unzipped[0]:,} -> {unzipped[1]:,} unzipped) in {elapsed_ms:.0f} ms"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import re
+from typing import Dict, Iterator, List, Set, Tuple
+
+# Runs of letters and digits; underscores and punctuation separate words
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into word tokens"""
+    return TOKEN_PATTERN.findall(text)
+
+
+class TokenIndex:
+    """
+    Word-boundary trigger matcher backed by hash indexes
+
+    Single-word triggers are looked up per token in a word index. Multi-word
+    triggers go through a phrase index keyed by their token tuple and are only
+    probed at tokens that start some phrase. Unlike substring matching,
+    "pipes" does not fire inside "bagpipes" and "addition" does not fire
+    inside "additional".
+    """
+
+    def __init__(self, patterns: List[str]):
+        """
+        Index the patterns by their tokens
+
+        Args:
+            patterns: Phrases to search for, already normalized (e.g. lowercased).
+                The position of each phrase in this list is the index reported
+                back by find(). Patterns without any word never match.
+        """
+        self.patterns = tuple(patterns)
+
+        words: Dict[str, List[int]] = {}
+        phrases: Dict[Tuple[str, ...], List[int]] = {}
+        phrase_lengths: Dict[str, Set[int]] = {}
+
+        for index, pattern in enumerate(self.patterns):
+            tokens = tuple(tokenize(pattern))
+            if len(tokens) == 1:
+                words.setdefault(tokens[0], []).append(index)
+            elif tokens:
+                phrases.setdefault(tokens, []).append(index)
+                phrase_lengths.setdefault(tokens[0], set()).add(len(tokens))
+
+        self._words = {token: tuple(indices) for token, indices in words.items()}
+        self._phrases = {tokens: tuple(indices) for tokens, indices in phrases.items()}
+        # First token of a phrase -> lengths of the phrases starting with it
+        self._phrase_lengths = {
+            token: tuple(sorted(lengths)) for token, lengths in phrase_lengths.items()
+        }
+
+    def find(self, text: str) -> Set[int]:
+        """Return the indices of all patterns that occur in the text as whole words"""
+        words = self._words
+        phrases = self._phrases
+        phrase_lengths = self._phrase_lengths
+
+        tokens = tokenize(text)
+        found = set()
+
+        for position, token in enumerate(tokens):
+            indices = words.get(token)
+            if indices:
+                found.update(indices)
+
+            lengths = phrase_lengths.get(token)
+            if lengths:
+                for length in lengths:
+                    if position + length > len(tokens):
+                        break
+                    indices = phrases.get(tuple(tokens[position:position + length]))
+                    if indices:
+                        found.update(indices)
+
+        return found
+
+    def scan(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield every whole-word occurrence of every pattern in the text
+
+        Returns:
+            Iterator of (pattern index, start, end) triples in order of their
+            first token; the match is text[start:end]
+        """
+        words = self._words
+        phrases = self._phrases
+        phrase_lengths = self._phrase_lengths
+
+        spans = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+        tokens = [text[start:end] for start, end in spans]
+
+        for position, token in enumerate(tokens):
+            start, end = spans[position]
+            for index in words.get(token, ()):
+                yield index, start, end
+
+            for length in phrase_lengths.get(token, ()):
+                if position + length > len(tokens):
+                    break
+                for index in phrases.get(tuple(tokens[position:position + length]), ()):
+                    yield index, start, spans[position + length - 1][1]
+
+    def find_segments(self, text: str, separator: str) -> List[Set[int]]:
+        """Run find() on every separator-delimited segment of the text"""
+        return [self.find(segment) for segment in text.split(separator)]
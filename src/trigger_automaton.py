@@ -0,0 +1,218 @@
+from collections import deque
+from typing import Dict, Iterator, List, Set, Tuple, Union
+
+# Below this many triggers, testing each one with `in` beats walking the
+# automaton character by character
+SMALL_CATALOG_TRIGGERS = 100
+
+
+class TriggerAutomaton:
+    """Aho-Corasick automaton that finds every trigger phrase in one pass"""
+
+    def __init__(self, patterns: List[str]):
+        """
+        Compile the patterns into a goto/fail automaton
+
+        Args:
+            patterns: Phrases to search for, already normalized (e.g. lowercased).
+                The position of each phrase in this list is the index reported
+                back by find() and scan().
+        """
+        self.patterns = tuple(patterns)
+
+        # State 0 is the root. _goto holds the trie edges, _fail the failure
+        # links and _out the pattern indices that end in each state (including
+        # those inherited through failure links).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        # An empty pattern is a substring of every text
+        self._always = tuple(
+            index for index, pattern in enumerate(self.patterns) if not pattern
+        )
+
+        self._build_trie()
+        self._build_failure_links()
+
+    def _build_trie(self) -> None:
+        """Insert every non-empty pattern into the trie"""
+        out: List[List[int]] = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    out.append([])
+                state = next_state
+            out[state].append(index)
+
+        self._out = [tuple(indices) for indices in out]
+
+    def _build_failure_links(self) -> None:
+        """Breadth-first pass computing failure links and merged outputs"""
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target
+
+                if self._out[target]:
+                    self._out[next_state] += self._out[target]
+
+    def scan(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield every occurrence of every pattern in the text
+
+        Returns:
+            Iterator of (pattern index, start, end) triples in order of their
+            end offset; the match is text[start:end]
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        patterns = self.patterns
+
+        for index in self._always:
+            yield index, 0, 0
+
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield index, position + 1 - len(patterns[index]), position + 1
+
+    def find(self, text: str) -> Set[int]:
+        """Return the indices of all patterns that occur in the text"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        # Only remember the states that emit output; expanding them to pattern
+        # indices once at the end keeps the per-character loop tight.
+        hits = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                hits.add(state)
+
+        found = set(self._always)
+        for state in hits:
+            found.update(out[state])
+        return found
+
+    def find_segments(self, text: str, separator: str) -> List[Set[int]]:
+        """
+        Run find() on every separator-delimited segment of the text in one pass
+
+        The separator must not occur in any pattern, so that no match can span
+        two segments.
+
+        Returns:
+            One set of pattern indices per segment
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        always = self._always
+        results = []
+        for segment in text.split(separator):
+            hits = set()
+            state = 0
+            for char in segment:
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if out[state]:
+                    hits.add(state)
+
+            found = set(always)
+            for state in hits:
+                found.update(out[state])
+            results.append(found)
+        return results
+
+
+class TriggerList:
+    """
+    Substring matcher for small trigger lists
+
+    Tests each pattern with str's own substring search. That is linear in
+    the number of patterns, but for a few dozen of them it is several times
+    faster than stepping the automaton through the text in Python. Reports
+    exactly what TriggerAutomaton does, in the same order.
+    """
+
+    def __init__(self, patterns: List[str]):
+        """
+        Args:
+            patterns: Phrases to search for, already normalized (e.g. lowercased).
+                The position of each phrase in this list is the index reported
+                back by find() and scan().
+        """
+        self.patterns = tuple(patterns)
+        self._indexed = tuple(enumerate(self.patterns))
+
+    def scan(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield every occurrence of every pattern in the text
+
+        Returns:
+            Iterator of (pattern index, start, end) triples in order of their
+            end offset, longer patterns first; the match is text[start:end]
+        """
+        matches = []
+        for index, pattern in self._indexed:
+            if not pattern:
+                # An empty pattern is a substring of every text, reported once
+                matches.append((0, 0, index))
+                continue
+            start = text.find(pattern)
+            while start != -1:
+                matches.append((start + len(pattern), start, index))
+                start = text.find(pattern, start + 1)
+
+        matches.sort()
+        for end, start, index in matches:
+            yield index, start, end
+
+    def find(self, text: str) -> Set[int]:
+        """Return the indices of all patterns that occur in the text"""
+        return {index for index, pattern in self._indexed if pattern in text}
+
+    def find_segments(self, text: str, separator: str) -> List[Set[int]]:
+        """
+        Run find() on every separator-delimited segment of the text
+
+        Returns:
+            One set of pattern indices per segment
+        """
+        return [self.find(segment) for segment in text.split(separator)]
+
+
+def substring_matcher(patterns: List[str]) -> Union[TriggerList, TriggerAutomaton]:
+    """Substring matcher for the patterns, picked by how many there are"""
+    if len(patterns) < SMALL_CATALOG_TRIGGERS:
+        return TriggerList(patterns)
+    return TriggerAutomaton(patterns)
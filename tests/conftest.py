@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).parent.parent
+SRC_DIR = REPO_DIR / "src"
+RULES_FILE = REPO_DIR / "data" / "permit_rules.json"
+TEMPLATES_DIR = REPO_DIR / "templates"
+
+sys.path.insert(0, str(SRC_DIR))
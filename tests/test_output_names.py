@@ -0,0 +1,72 @@
+"""
+Concurrent fills of the same permit with the same data: no output
+overwrites another and no partial document is ever visible
+
+Every fill runs within the same second or two, so with one-second
+timestamps nearly all of them would collide. A watcher thread meanwhile
+opens every .docx that appears in the output directory and records any
+incomplete one.
+"""
+import asyncio
+import threading
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from .conftest import TEMPLATES_DIR
+from form_filler import FormFiller
+
+FILLS = 1000
+
+PROJECT_DATA = {
+    "projectAddress": "123 Main Street, Springfield",
+    "ownerName": "Jane Doe",
+}
+
+
+def watch(output_dir, stop, problems):
+    """Open every visible document until told to stop"""
+    checked = set()
+    while not stop.is_set():
+        for path in output_dir.rglob("*.docx"):
+            if path.name in checked:
+                continue
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    if archive.testzip() is not None:
+                        problems.append(f"corrupt member in {path.name}")
+            except (zipfile.BadZipFile, EOFError) as e:
+                problems.append(f"partial document {path.name}: {e}")
+            checked.add(path.name)
+
+
+async def fill_all(filler, fills):
+    return await asyncio.gather(*[
+        filler.fill_permit_async("building-permit.docx", "building", "Building Permit", PROJECT_DATA)
+        for _ in range(fills)
+    ])
+
+
+@pytest.mark.parametrize("executor, workers", [("thread", 8), ("process", 4)])
+def test_concurrent_fills_get_distinct_complete_outputs(tmp_path, executor, workers):
+    filler = FormFiller(str(TEMPLATES_DIR), str(tmp_path), executor, workers, deduplicate=False)
+    filler.start()
+
+    stop = threading.Event()
+    problems = []
+    watcher = threading.Thread(target=watch, args=(tmp_path, stop, problems))
+    watcher.start()
+    try:
+        results = asyncio.run(fill_all(filler, FILLS))
+    finally:
+        stop.set()
+        watcher.join()
+        filler.shutdown()
+
+    names = [result["outputFile"] for result in results]
+    files = sorted(path.name for path in Path(tmp_path).rglob("*.docx"))
+
+    assert not problems, problems[:5]
+    assert len(set(names)) == FILLS
+    assert files == sorted(names)
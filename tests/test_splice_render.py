@@ -0,0 +1,98 @@
+"""
+Splicing values into the shipped templates produces exactly what docxtpl
+renders, member for member, for plain, edge-case and random values
+(including values that must fall back to docxtpl)
+"""
+import io
+import random
+import zipfile
+
+import pytest
+from docxtpl import DocxTemplate
+
+from .conftest import TEMPLATES_DIR
+from template_cache import TemplateCache
+
+RANDOM_CASES = 200
+
+EDGE_VALUES = [
+    "",
+    " ",
+    "  padded  ",
+    "Acme Builders",
+    "a > b",
+    'He said "yes"',
+    "it's",
+    "café € 中文 \U0001f3d7",
+    "  ​\x7f\x85",
+    "]]>",
+    "{{ notAVariable }}",
+    "{% if %}",
+    "x" * 10000,
+    0,
+    -12,
+    3.25,
+    1e16,
+    True,
+    None,
+    # docxtpl alters these, so they must fall back
+    "Acme & Sons",
+    "a < b",
+    "line\nbreak",
+    "tab\there",
+    "\x07\x0c",
+    "{_{ escaped }_}",
+    {"nested": "dict"},
+    ["a", "list"],
+]
+
+SAFE_CHARACTERS = "ab Z09 >\"'é€{}_%-]"
+# Characters that make docxtpl alter a value
+RISKY_CHARACTERS = "&<\n\t"
+
+
+def parts(document):
+    with zipfile.ZipFile(io.BytesIO(document)) as archive:
+        return [(name, archive.read(name)) for name in archive.namelist()]
+
+
+def render_docxtpl(template_path, context):
+    """What fill_permit rendered before any caching"""
+    document = DocxTemplate(template_path)
+    document.render(context)
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def random_value(rng):
+    characters = [rng.choice(SAFE_CHARACTERS) for _ in range(rng.randrange(0, 12))]
+    if rng.random() < 0.02:
+        characters.insert(rng.randrange(len(characters) + 1), rng.choice(RISKY_CHARACTERS))
+    return "".join(characters)
+
+
+def contexts(variables, rng, random_cases):
+    names = sorted(variables)
+    yield {}
+    yield {name: name for name in names}
+    for value in EDGE_VALUES:
+        yield {name: value for name in names}
+        yield {names[0]: value, names[-1]: "end"}
+    for _ in range(random_cases):
+        yield {name: random_value(rng) for name in names if rng.random() < 0.8}
+
+
+@pytest.mark.parametrize("template_path", sorted(TEMPLATES_DIR.glob("*.docx")), ids=lambda path: path.name)
+def test_splicing_renders_like_docxtpl(template_path):
+    compiled = TemplateCache().get(template_path)
+    assert compiled.spliced
+
+    rng = random.Random(25)
+    spliced = 0
+    for context in contexts(compiled.variables, rng, RANDOM_CASES):
+        assert parts(compiled.render(context)) == parts(render_docxtpl(template_path, context)), context
+        spliced += compiled._splice.render(context) is not None
+
+    # Both paths were exercised
+    assert 0 < spliced < RANDOM_CASES
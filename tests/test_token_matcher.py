@@ -0,0 +1,88 @@
+"""
+Conformance of the 'token' matching engine
+
+For every trigger in data/permit_rules.json, the token engine agrees with
+the substring engine whenever the trigger appears as whole words, and it
+rejects the known substring false hits.
+"""
+import json
+
+import pytest
+
+from .conftest import RULES_FILE
+from permit_matcher import PermitMatcher
+from token_index import TokenIndex
+
+# Contexts a trigger is embedded in; {} is replaced by the trigger
+WHOLE_WORD_CONTEXTS = [
+    "{}",
+    "{} for the rear of the house",
+    "Owner wants {} done next month",
+    "Scope: {}.",
+    "kitchen remodel ({}), plus paint",
+    "{}, {} and more {}",
+]
+
+# Substring hits the token engine must not report: (description, permit id)
+SUBSTRING_FALSE_HITS = [
+    ("bagpipes display case", "plumbing"),
+    ("additional parking spaces", "building"),
+    ("deconstructionist art mural", "building"),
+    ("unstructural garden layout", "building"),
+]
+
+# Phrases that share a first word, and texts ending inside the longer one
+PREFIX_PHRASES = ["new building", "new building permit"]
+PREFIX_PHRASE_TEXTS = [
+    ("a new building", {0}),
+    ("a new building permit", {0, 1}),
+    ("new", set()),
+]
+
+TRIGGERS = [
+    (permit['id'], trigger)
+    for permit in json.loads(RULES_FILE.read_text())['permits']
+    for trigger in permit['triggers']
+]
+
+
+def ids(permits):
+    return [permit['id'] for permit in permits]
+
+
+@pytest.fixture(scope="module")
+def substring():
+    return PermitMatcher(str(RULES_FILE), engine='substring', snapshot=False)
+
+
+@pytest.fixture(scope="module")
+def token():
+    return PermitMatcher(str(RULES_FILE), engine='token', snapshot=False)
+
+
+@pytest.mark.parametrize("permit_id, trigger", TRIGGERS)
+@pytest.mark.parametrize("context", WHOLE_WORD_CONTEXTS)
+def test_whole_word_triggers_match_like_substrings(substring, token, permit_id, trigger, context):
+    for text in (trigger, trigger.upper(), trigger.title()):
+        description = context.format(text, text, text)
+        expected = ids(substring.identify_permits(description))
+        assert ids(token.identify_permits(description)) == expected, description
+        assert permit_id in expected, description
+
+
+@pytest.mark.parametrize("permit_id, trigger", TRIGGERS)
+def test_work_types_go_through_the_same_engine(substring, token, permit_id, trigger):
+    assert ids(token.identify_permits("", [trigger])) == ids(substring.identify_permits("", [trigger]))
+
+
+@pytest.mark.parametrize("description, permit_id", SUBSTRING_FALSE_HITS)
+def test_substring_false_hits_are_rejected(substring, token, description, permit_id):
+    assert permit_id in ids(substring.identify_permits(description))
+    assert permit_id not in ids(token.identify_permits(description))
+
+
+@pytest.mark.parametrize("text, expected", PREFIX_PHRASE_TEXTS)
+def test_phrase_ending_the_text_does_not_probe_past_it(text, expected):
+    index = TokenIndex(PREFIX_PHRASES)
+    assert index.find(text) == expected
+    assert {found for found, _, _ in index.scan(text)} == expected